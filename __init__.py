@@ -16,4 +16,6 @@ from src.args import args
 from src.download import download
 from src.search import search
 from src.extract import extract
+from src.pipeline import pipeline
+from src.harvest import harvest
 from src.utils import empty_temp
\ No newline at end of file
@@ -14,12 +14,18 @@ from src.args import args
 from src.download import download
 from src.search import search
 from src.extract import extract
+from src.pipeline import pipeline
+from src.harvest import harvest
 from src.utils import empty_temp
 from multiprocessing import freeze_support
 
 if __name__ == "__main__":
     freeze_support()
-    if args.search:
+    if args.harvest:
+        harvest(args)
+    elif args.pipeline:
+        pipeline(args)
+    elif args.search:
         search(args)
     elif args.download:
         download(args)
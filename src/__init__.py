@@ -13,6 +13,8 @@ from src.args import args
 from src.download import download, download
 from src.extract import extract, extract
 from src.search import search, search
+from src.pipeline import pipeline
+from src.harvest import harvest
 from src.utils import empty_temp
 from src.gportal import *
 from src.jasmes import * 
@@ -27,6 +27,9 @@ for i, d in enumerate(dirs):
 
 TEMP_FOLDER = Path(os.path.join(tempfile.gettempdir(), "SGLICollect"))
 TEMP_FOLDER.mkdir(exist_ok=True)
+# persistent caches live in the temp folder but survive empty_temp
+CACHE_FOLDER = TEMP_FOLDER / "cache"
+CACHE_FOLDER.mkdir(exist_ok=True)
 
 parser = argparse.ArgumentParser(
     description="Welcome to SGLICollect!\n"
@@ -51,6 +54,16 @@ parser.add_argument(
     action="store_true",
     help="extract the pixel matching the lat, and long from the product",
 )
+parser.add_argument(
+    "--pipeline",
+    action="store_true",
+    help="search, download and extract at the same time, each product is extracted as soon as it is downloaded",
+)
+parser.add_argument(
+    "--harvest",
+    action="store_true",
+    help="store the GPortal products of a date range and area in the local footprint index",
+)
 
 parser.add_argument(
     "-p",
@@ -73,7 +86,7 @@ parser.add_argument(
     "--csv",
     nargs="?",
     type=Path,
-    help="a path to a json file containing the search results",
+    help="a path to a csv (or .parquet, .feather) file containing the search results",
 )
 parser.add_argument(
     "--no-repeat", action="store_true", help="don't repeat if identifier exists"
@@ -92,6 +105,136 @@ parser.add_argument(
 parser.add_argument(
     "--product-dir", type=Path, help="directory containing products to extract"
 )
+parser.add_argument(
+    "--geo-cache",
+    action="store_true",
+    help="cache the interpolated latitude and longitude of each product on disk\nto skip the interpolation when extracting from the same product again",
+)
+parser.add_argument(
+    "--max-distance",
+    type=float,
+    help="reject extracted pixels farther than this great-circle distance (km) from the point",
+)
+parser.add_argument(
+    "--lazy-geo",
+    action="store_true",
+    help="locate the pixels using the tie points and interpolate only the cells around each point\n(lower memory, for small machines)",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="number of processes extracting products in parallel",
+)
+parser.add_argument(
+    "--search-workers",
+    type=int,
+    default=1,
+    help="number of GPortal search requests in flight at once",
+)
+parser.add_argument(
+    "--rate-limit",
+    type=float,
+    help="maximum number of search requests per second",
+)
+parser.add_argument(
+    "--parallel-downloads",
+    type=int,
+    default=1,
+    help="number of files downloaded at the same time",
+)
+parser.add_argument(
+    "--download-workers",
+    type=int,
+    default=20,
+    help="number of download threads (and connections) shared by all the files",
+)
+parser.add_argument(
+    "--max-bandwidth",
+    type=float,
+    help="total download rate limit in MB/s",
+)
+parser.add_argument(
+    "--pipeline-queue",
+    dest="pipeline_queue",
+    default=2,
+    type=int,
+    help="number of products waiting between two stages of the pipeline",
+)
+parser.add_argument(
+    "--jasmes-host",
+    dest="jasmes_host",
+    default="apollo.eorc.jaxa.jp",
+    type=str,
+    help="host name of the JASMES ftp server, optionally followed by :port",
+)
+parser.add_argument(
+    "--jasmes-connections",
+    dest="jasmes_connections",
+    default=4,
+    type=int,
+    help="number of ftp connections used to download the JASMES products in parallel",
+)
+parser.add_argument(
+    "--listing-ttl",
+    dest="listing_ttl",
+    default=24.0,
+    type=float,
+    help="number of hours the JASMES directory listings are cached for the search",
+)
+parser.add_argument(
+    "--search-cluster",
+    dest="search_cluster",
+    default=1.0,
+    type=float,
+    help="size in degrees of the cells grouping the nearby points of a date searched by one GPortal query (0 for one query per point)",
+)
+parser.add_argument(
+    "--search-cache",
+    dest="search_cache",
+    action="store_true",
+    help="cache the GPortal search responses on disk, the same search is not sent twice",
+)
+parser.add_argument(
+    "--search-cache-expiry",
+    dest="search_cache_expiry",
+    default=168.0,
+    type=float,
+    help="number of hours the cached GPortal search responses are valid",
+)
+parser.add_argument(
+    "--footprint-index",
+    dest="footprint_index",
+    type=Path,
+    help="sqlite index of the GPortal footprints filled by harvest",
+)
+parser.add_argument(
+    "--start-date",
+    dest="start_date",
+    type=str,
+    help="first date harvested, YYYY/MM/DD",
+)
+parser.add_argument(
+    "--end-date",
+    dest="end_date",
+    type=str,
+    help="last date harvested, YYYY/MM/DD (default: start date)",
+)
+parser.add_argument(
+    "--bbox",
+    nargs=4,
+    type=float,
+    default=[-90, -180, 90, 180],
+    metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"),
+    help="area harvested",
+)
+parser.add_argument(
+    "--harvest-tile",
+    dest="harvest_tile",
+    default=10.0,
+    type=float,
+    help="size in degrees of the tiles of the area searched separately by harvest (0 for one search)",
+)
 args, _ = parser.parse_known_args()
 
 def is_valid_GPortalLvlProd(prod: str):
@@ -109,7 +252,7 @@ if args.config_file:
         else:
             setattr(args, k, config["args"][k])
 
-if not args.search and not args.download and not args.extract:
+if not args.search and not args.download and not args.extract and not args.pipeline and not args.harvest:
     print("No option provided!")
     parser.print_help()
     exit(1)
@@ -119,11 +262,18 @@ if args.api == SGLIAPIs.GPORTAL:
         print("Invalid Product value for GPortal")
         exit(1)
 
-if not args.csv:
+if args.harvest:
+    if args.api != SGLIAPIs.GPORTAL:
+        print("harvest is only available for GPortal")
+        exit(1)
+    if not args.footprint_index or not args.start_date:
+        print("harvest needs footprint_index and start_date")
+        exit(1)
+elif not args.csv:
     print("Data must be provided using csv")
     exit(1)
 
-if args.download:
+if args.download or args.pipeline:
     args.download_dir.mkdir(exist_ok=True, parents=True) # create the download directory if it doesn't exist
     
 if args.cred == None:
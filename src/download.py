@@ -10,11 +10,11 @@
 
 
 from argparse import Namespace
-import pandas as pd
 from src.jasmes.jasmes_collector import JasmesCollector
 from src.api_types import SGLIAPIs
 from src.gportal import GPortalLvlProd, GportalApi
 from src.extract import extract
+from src.tables import read_table, table_columns
 
 def download(args: Namespace):
     """
@@ -22,6 +22,11 @@ def download(args: Namespace):
     arguments provided through json file or cmdline arguments:
         - product: GPortal Products or Jasmes Products
         - download_dir: directory to download the file
+        - parallel_downloads: number of files downloaded at the same time (GPORTAL), default: 1
+        - download_workers: number of threads (and connections) shared by all the downloads (GPORTAL), default: 20
+        - max_bandwidth: total download rate limit in MB/s (GPORTAL), default: no limit
+        - jasmes_host: host name of the JASMES ftp server (JASMES), default: apollo.eorc.jaxa.jp
+        - jasmes_connections: number of files of a product downloaded in parallel (JASMES), default: 4
         - cred: path to json file containing account and password
         |       Example:
         |       {
@@ -33,10 +38,11 @@ def download(args: Namespace):
     """
     if args.api == SGLIAPIs.GPORTAL:
         pl = GPortalLvlProd(args.product)
-        api = GportalApi(pl)
+        max_bandwidth = args.max_bandwidth * 1024 * 1024 if args.max_bandwidth else None
+        api = GportalApi(pl, max_workers=args.download_workers, max_bandwidth=max_bandwidth)
         group_key = "download_url"
     elif args.api == SGLIAPIs.JASMES:
-        api = JasmesCollector()
+        api = JasmesCollector(host=args.jasmes_host, max_connections=args.jasmes_connections)
         group_key = "ftp_path_NWLR_380"
     
     print("=============================")
@@ -46,21 +52,30 @@ def download(args: Namespace):
     # this is only needed for download not search
     api.set_auth_details(args.cred)
 
-    df = pd.read_csv(args.csv, low_memory=True) # read csv
+    # only the columns locating the files are read
+    columns = [c for c in table_columns(args.csv) if c == group_key or c.startswith("ftp_path")]
+    df = read_table(args.csv, columns) # read csv
     df =df.groupby(group_key) # only download uniqe urls
 
-    for i, (url, g) in enumerate(df):
-        print(f"> {i+1}/{len(df)}", end=": \n") # progress indicator 
-        if args.api == SGLIAPIs.JASMES:
+    if args.api == SGLIAPIs.GPORTAL:
+        # all the urls go through one scheduler keeping parallel_downloads files in flight
+        urls = [url for url, _ in df]
+        print(f"> {len(urls)} files")
+        paths = api.download_many(urls, args.download_dir, max_files=args.parallel_downloads)
+        api.close()
+        failed = sum(p is None for p in paths)
+        if failed:
+            print(f"> {failed} files failed, run again to download them")
+    else:
+        for i, (url, g) in enumerate(df):
+            print(f"> {i+1}/{len(df)}", end=": \n") # progress indicator 
             row = g.iloc[0].to_dict()
             paths = {}
             for k in row.keys():
                 if k.startswith("ftp_path"):
                     paths[k] = row[k]
             api.download(paths, args.download_dir)
-        else:
-            # start the download of the i's url
-            api.download(url, args.download_dir)
+        api.close()
 
     if args.extract:
         setattr(args, "product_dir", args.download_dir)
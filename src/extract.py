@@ -14,12 +14,80 @@ import os
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from src.extractors import GPortalL1BExtractor, GPortalL2PExtractor, GPortalL2RExtractor
 from src.extractors.jasmes_multi_extractor import JASMESMultiExtractor
 from src.gportal import GPortalLvlProd
 from src.api_types import SGLIAPIs
+from src.journal import Journal
+from src.utils import ColumnBuffer
+from src.tables import read_table, table_columns
 from sys import exit
 
+def select_extractor(args:Namespace) -> tuple[str, type]:
+    """
+    selects the apropriate extractor as a class and the csv column identifying its products
+    """
+    if args.api == SGLIAPIs.GPORTAL:
+        group_key = "identifier"
+        p = GPortalLvlProd(args.product)
+        if p == GPortalLvlProd.L1B:
+            Extractor = GPortalL1BExtractor
+        elif p == GPortalLvlProd.L2R:
+            Extractor = GPortalL2RExtractor
+        elif p == GPortalLvlProd.L2P:
+            Extractor = GPortalL2PExtractor
+        else:
+            print("level or product not supported yet")
+            exit(1)
+    elif args.api == SGLIAPIs.JASMES:
+        group_key = "ftp_path_NWLR_380"
+        Extractor = JASMESMultiExtractor
+    else:
+        print("to be implemented")
+        exit(1)
+
+    return group_key, Extractor
+
+def extract_group(args:Namespace, Extractor:type, id:str, group:pd.DataFrame) -> dict:
+    """
+    opens the product of a group and extracts the pixels of all its lat, lon pairs at once
+
+    | args: the extract arguments (api, product_dir, geo_cache, max_distance, lazy_geo)
+    | Extractor: the extractor class of the product
+    | id: the product identifier (or the ftp path of NWLR_380 for JASMES)
+    | group: the rows of the product, must contain lat, lon (and the ftp_path columns for JASMES)
+
+    returns the columnar pixels, or None if the product cannot be opened or read
+    """
+    # make the product path by joining the product name and the product directory
+    prod_path = os.path.join(args.product_dir, Extractor.make_file_name(id))
+    try:
+        # try to open the product (may fail if file is corrupt)
+        if args.api == SGLIAPIs.GPORTAL:
+            extractor = Extractor(prod_path, geo_cache=args.geo_cache, max_distance=args.max_distance, lazy_geo=args.lazy_geo)
+        elif args.api == SGLIAPIs.JASMES:
+            row = group.iloc[0].to_dict()
+            paths = {}
+            for k in row.keys():
+                if k.startswith("ftp_path"):
+                    paths[Extractor.extract_prod_name(k).value] = os.path.join(args.product_dir, Extractor.make_file_name(row[k]))
+            extractor = Extractor(paths)
+    except:
+        # move to next product if failed to open the product
+        print(f"file corrupted {prod_path}")
+        return None
+    # extract the pixels of all the lat, lon pairs in the group at once
+    lats = group["lat"].to_numpy(dtype=np.float64)
+    lons = group["lon"].to_numpy(dtype=np.float64)
+    try:
+        return extractor.get_pixels(lats, lons)
+    except Exception as e:
+        print(e)
+        return None
+    finally:
+        extractor.close()
+
 def extract(args:Namespace):
     """
     Bulk extract operation using csv file
@@ -27,6 +95,10 @@ def extract(args:Namespace):
         - api: GPORTAL or JASMES, default: GPORTAL
         - product: L1B, L2R, or L2P
         - csv: path to csv file
+        - geo_cache: boolean, cache the interpolated geolocation of each product on disk
+        - max_distance: float, pixels farther than this distance (km) from the point are set to NaN
+        - lazy_geo: boolean, interpolate the geolocation only around each point (low memory)
+        - workers: int, number of processes extracting products in parallel (default: 1)
     CSV file columns:
         - identifier: product identifier
         - lat       : latitude
@@ -71,25 +143,7 @@ def extract(args:Namespace):
         - TSM       : Total Suspended Matter (g/m3)
 
     """
-    # select the apropriate extractor as a class 
-    if args.api == SGLIAPIs.GPORTAL:
-        group_key = "identifier"
-        p = GPortalLvlProd(args.product)
-        if p == GPortalLvlProd.L1B:
-            Extractor = GPortalL1BExtractor
-        elif p == GPortalLvlProd.L2R:
-            Extractor = GPortalL2RExtractor
-        elif p == GPortalLvlProd.L2P:
-            Extractor = GPortalL2PExtractor
-        else:
-            print("level or product not supported yet")
-            exit(1)
-    elif args.api == SGLIAPIs.JASMES:
-        group_key = "ftp_path_NWLR_380"
-        Extractor = JASMESMultiExtractor
-    else:
-        print("to be implemented")
-        exit(1)
+    group_key, Extractor = select_extractor(args)
 
     # product directory must be provided
     if args.product_dir == None:
@@ -101,64 +155,62 @@ def extract(args:Namespace):
     print("=============================")
 
     # reading the CSV file containing the product identifier and lat, lon pairs
-    df = pd.read_csv(args.csv, low_memory=True)
+    # only the identifier and lat, lon columns are read, the whole file is read again to save the results
+    projection = [c for c in table_columns(args.csv) if c in (group_key, "lat", "lon") or c.startswith("ftp_path")]
+    df = read_table(args.csv, projection)
+    # the extracted rows are appended to the journal, the rows done by an interrupted run are skipped
+    journal = Journal(args.csv, "extract", df)
 
     # filter for records that contain an identifier
-    filtered = df[df[group_key].str.len() >= 41]
+    filtered = df[~df.index.isin(journal.done)]
+    filtered = filtered[filtered[group_key].str.len() >= 41]
     # filter for records that contain both lat and lon
     filtered = filtered[~np.isnan(filtered[["lat", "lon"]]).any(axis=1)]
     # define the progress bar
     pbar = tqdm(filtered[group_key], position=0, leave=True)
     # group by identifier to open the product only once
     grouped = filtered.groupby(group_key)
-    for i, (id, group) in enumerate(grouped):
-        # make the product path by joining the product name and the product directory
-        prod_path = os.path.join(args.product_dir, Extractor.make_file_name(id))
-        try:
-            # try to open the product (may fail if file is corrupt)
-            if args.api == SGLIAPIs.GPORTAL:
-                # make the product path by joining the product name and the product directory
-                prod_path = os.path.join(args.product_dir, Extractor.make_file_name(id))
-                extractor = Extractor(prod_path)
-            elif args.api == SGLIAPIs.JASMES:
-                row = group.iloc[0].to_dict()
-                paths = {}
-                for k in row.keys():
-                    if k.startswith("ftp_path"):
-                        paths[Extractor.extract_prod_name(k).value] = os.path.join(args.product_dir, Extractor.make_file_name(row[k]))
-                extractor = Extractor(paths)
-        except:
-            # move to next product if failed to open the product
-            pbar.update(len(group))
-            print(f"file corrupted {prod_path}")
-            continue
-        # for each lat, lon pair in the group extract the corresponding pixel
-        for r in range(len(group)):
-            lat, lon = float(group.iloc[r]["lat"]), float(group.iloc[r]["lon"])
-            # extract pixel values
-            try:
-                pixel = extractor.get_pixel(lat, lon)
-                # add the pixel to the df
-                for k in pixel.keys():
-                    df.loc[group.index[r], k] = pixel[k]
-            except Exception as e:
-                print(e)
-                continue
-            # update the progress bar
-            pbar.set_description(f"{i+1}/{len(grouped)}:{id.split('/')[-1]}###{r+1}/{len(group)}")
-            pbar.update()
-        # after 10 groups save csv
-        if i % 10 == 0: df.to_csv(args.csv, index=False)
+    # only the columns needed to open the products and locate the points are sent to the workers
+    columns = ["lat", "lon"] + [c for c in filtered.columns if c.startswith("ftp_path")]
+
+    def merge(i, id, group, pixels):
+        # add the pixels to the journal (failed products are retried by the next run)
+        if pixels is not None:
+            journal.add(group.index, pixels)
+        # update the progress bar
+        pbar.set_description(f"{i+1}/{len(grouped)}:{id.split('/')[-1]}")
+        pbar.update(len(group))
+
+    if args.workers > 1:
+        # each product is opened and extracted in its own process
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {
+                executor.submit(extract_group, args, Extractor, id, group[columns]): (id, group)
+                for id, group in grouped
+            }
+            for i, future in enumerate(as_completed(futures)):
+                id, group = futures[future]
+                merge(i, id, group, future.result())
+    else:
+        for i, (id, group) in enumerate(grouped):
+            merge(i, id, group, extract_group(args, Extractor, id, group))
 
     # finally, close the progress bar and save to the csv
     pbar.close()
 
+    # copy the extracted pixels to the whole file
+    journal.flush(df)
+    rows = sorted(journal.done)
+    pixels = ColumnBuffer()
+    pixels.add(rows, {c: df.loc[rows, c].to_numpy() for c in df.columns if c not in projection})
+    df = read_table(args.csv)
+    pixels.flush(df)
     # clean columns
     for c in df.columns:
         if c.startswith("Unnamed"):
             df.drop(columns=c, inplace=True)
     # final save
-    df.to_csv(args.csv, index=False)
+    journal.commit(df)
 
 
 
@@ -9,28 +9,43 @@
 #
 
 from pathlib import Path
+import os
 import h5py
 import numpy as np
+from src.args import CACHE_FOLDER
+from src.extractors.utils import GeoIndex, TiePointIndex
 
 class Extractor:
     _h5: h5py.File = None
+    _lat_lon: tuple[np.ndarray, np.ndarray] = None
+    _index: GeoIndex | TiePointIndex = None
 
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, geo_cache: bool=False, max_distance: float=None, lazy_geo: bool=False):
         """
         initialize the extractor with h5 file
         
-        :path Path path to h5 product file
+        | path: Path path to h5 product file
+        | geo_cache: bool keep the interpolated latitude and longitude on disk (memory-mapped .npy)
+        | max_distance: float reject matches farther than this great-circle distance in km (None to accept all)
+        | lazy_geo: bool search the tie points and interpolate only the cells around each point
+        |           instead of interpolating the whole geolocation grid
         """
         # print("reading file: %s" % path)
         f = h5py.File(path, 'r')
         self._h5 = f
+        self._path = Path(path)
+        self._geo_cache = geo_cache
+        self._max_distance = max_distance
+        self._lazy_geo = lazy_geo
 
     def close(self):
         """
         closes the h5 file
         """
         self._h5.close()
+        self._lat_lon = None
+        self._index = None
 
     def bilin_2d(self, data: np.ndarray, interval: int, lon_mode:bool=False):
         """
@@ -79,6 +94,64 @@ class Extractor:
     def get_lat_lon(self) -> tuple[list[float], list[float]]:
         """
         get the 2d vector of latitude and longitude
+
+        the grid is interpolated once per open product, and once per product identifier if geo_cache is set
+        """
+        if self._lat_lon is not None:
+            return self._lat_lon
+        if self._geo_cache:
+            self._lat_lon = self.__load_cached_lat_lon()
+            if self._lat_lon is not None:
+                return self._lat_lon
+        self._lat_lon = self.__interpolate_lat_lon()
+        if self._geo_cache:
+            self.__save_cached_lat_lon(*self._lat_lon)
+        return self._lat_lon
+
+    def __cache_paths(self) -> tuple[Path, Path]:
+        """
+        paths of the cached latitude and longitude grids, keyed by the product identifier
+        """
+        identifier = self._path.stem
+        return CACHE_FOLDER / f"{identifier}.lat.npy", CACHE_FOLDER / f"{identifier}.lon.npy"
+
+    def __load_cached_lat_lon(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        memory-maps the cached grids, returns None if they are not cached (or unreadable)
+        """
+        lat_path, lon_path = self.__cache_paths()
+        if not lat_path.exists() or not lon_path.exists():
+            return None
+        try:
+            return np.load(lat_path, mmap_mode='r'), np.load(lon_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def __save_cached_lat_lon(self, lat: np.ndarray, lon: np.ndarray):
+        """
+        saves the grids to the cache, each file is written to a temporary name then renamed
+        so a concurrent reader never sees a partial file
+        """
+        for path, data in zip(self.__cache_paths(), (lat, lon)):
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(data))
+            os.replace(tmp_path, path)
+
+    def __image_shape(self, size_lin: int, size_pxl: int) -> tuple[int, int]:
+        """
+        shape of the image given the shape of the interpolated geolocation grid
+        """
+        img_attrs = self._h5['Image_data'].attrs
+        img_n_pix = img_attrs['Number_of_pixels'][0]
+        img_n_lin = img_attrs['Number_of_lines'][0]
+        if (img_n_lin <= size_lin) and (img_n_pix <= size_pxl):
+            return img_n_lin, img_n_pix
+        return size_lin, size_pxl
+
+    def __interpolate_lat_lon(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        reads the latitude and longitude and interpolates them to the image resolution
         """
         lat = self._h5['Geometry_data/Latitude']
         lon = self._h5['Geometry_data/Longitude']
@@ -86,16 +159,58 @@ class Extractor:
         if resampling_interval > 1:
             lat = self.bilin_2d(lat[:], resampling_interval, False)
             lon = self.bilin_2d(lon[:], resampling_interval, True)
+        else:
+            lat, lon = lat[:], lon[:]
+        img_n_lin, img_n_pix = self.__image_shape(*lat.shape)
+        return lat[:img_n_lin, :img_n_pix], lon[:img_n_lin, :img_n_pix]
+
+    def __tie_point_index(self) -> TiePointIndex:
+        """
+        builds the spatial index over the tie points without interpolating the whole grid
+        """
+        lat = self._h5['Geometry_data/Latitude']
+        lon = self._h5['Geometry_data/Longitude']
+        resampling_interval = max(int(lat.attrs['Resampling_interval'][0]), 1)
         (size_lin, size_pxl) = lat.shape
+        if resampling_interval > 1:
+            size_lin, size_pxl = size_lin * resampling_interval, size_pxl * resampling_interval
+        shape = self.__image_shape(size_lin, size_pxl)
+        return TiePointIndex(lat[:], lon[:], resampling_interval, shape)
+
+    def find_pixels(self, lats:np.ndarray, lons:np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        finds the closest pixel of each point, the spatial index is built once per open product
+
+        | lats: np.ndarray the latitudes of the points
+        | lons: np.ndarray the longitudes of the points
+
+        returns the rows, columns and great-circle distances (km)
+        """
+        if self._index is None:
+            if self._lazy_geo:
+                self._index = self.__tie_point_index()
+            else:
+                self._index = GeoIndex(*self.get_lat_lon())
+        return self._index.query(lats, lons)
+
+    def reject_far(self, pixels:dict, distances:np.ndarray) -> dict:
+        """
+        sets the values of the points farther than max_distance to NaN,
+        and of the points that could not be located (infinite distance)
+
+        | pixels: dict the columnar pixel values
+        | distances: np.ndarray the great-circle distance (km) of each point to its pixel
+        """
+        far = ~np.isfinite(distances)
+        if self._max_distance is not None:
+            far |= distances > self._max_distance
+        if not far.any():
+            return pixels
+        for k in pixels.keys():
+            pixels[k] = np.asarray(pixels[k], dtype=np.float64)
+            pixels[k][far] = np.nan
+        return pixels
 
-        img_attrs = self._h5['Image_data'].attrs
-        img_n_pix = img_attrs['Number_of_pixels'][0]
-        img_n_lin = img_attrs['Number_of_lines'][0]
-        if (img_n_lin <= size_lin) and (img_n_pix <= size_pxl):
-            lat = lat[:img_n_lin, :img_n_pix]
-            lon = lon[:img_n_lin, :img_n_pix]
-        return lat, lon
-    
     def get_pixel(self, lat:float, lon:float)-> dict:
         """
         get the pixel value accross different products
@@ -104,6 +219,25 @@ class Extractor:
         | lon: float the longitude of the required pixel
         """
         pass
+
+    def get_pixels(self, lats:np.ndarray, lons:np.ndarray) -> dict:
+        """
+        get the pixel values for many points of the same product at once
+
+        | lats: np.ndarray the latitudes of the required pixels
+        | lons: np.ndarray the longitudes of the required pixels
+
+        returns a columnar dict mapping each output column to an array with one value per point
+        """
+        records = [self.get_pixel(float(lat), float(lon)) for lat, lon in zip(lats, lons)]
+        columns = {}
+        for i, record in enumerate(records):
+            for k in record.keys():
+                if k not in columns:
+                    columns[k] = np.full(len(records), np.nan, dtype=object)
+                columns[k][i] = record[k]
+        return columns
+
     @classmethod
     def get_file_ext(self)->str:
         return "h5"
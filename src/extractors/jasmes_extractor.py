@@ -11,6 +11,7 @@
 from pathlib import Path
 from src.jasmes import JASMESInternalProd
 from src.extractors.extractor_interface import Extractor
+from src.extractors.utils import read_pixels
 import numpy as np
 from netCDF4 import Dataset
 
@@ -19,11 +20,13 @@ class JASMESExtractor(Extractor):
         self.__prod = prod
         self.__nc = Dataset(path, "r")
 
-    def __handle_digital_number(self, rrs:bool=False) -> np.ndarray[float, float]:
+    def __handle_digital_number(self, rows:np.ndarray, cols:np.ndarray, rrs:bool=False) -> np.ndarray[float]:
         """
-        Convert digital number to the desired product
+        Convert digital number to the desired product, only the pixels at (rows, cols) are read and converted
 
-        :prod JASMESProd 
+        | rows: np.ndarray rows of the pixels
+        | cols: np.ndarray columns of the pixels
+        | rrs: bool convert to remote sensing reflectance
         """
         # Get data
         prod:str = str(self.__prod.value)
@@ -33,10 +36,10 @@ class JASMESExtractor(Extractor):
         if rrs:
             scale = data.Rrs_scale_factor
             offset = data.Rrs_add_offset
-            digital_data = (data[:].data - data.add_offset)/data.scale_factor
+            digital_data = (read_pixels(data, rows, cols) - data.add_offset)/data.scale_factor
             physical_data = digital_data * scale + offset
         else:
-            physical_data = data[:].data
+            physical_data = read_pixels(data, rows, cols).astype(np.float64)
         physical_data[physical_data > data.Maximum_valid_DN] = np.nan
         physical_data[physical_data < data.Minimum_valid_DN] = np.nan
         return physical_data
@@ -51,31 +54,33 @@ class JASMESExtractor(Extractor):
     def make_file_name(self, file_name)->str:
         return file_name
 
-    def __find_entry(self, lat_arr, lon_arr, lat, lon) ->tuple[int, int]:
-        dist = 1000
-        lat_index = -1
-        for i,l in enumerate(lat_arr):
-            if np.abs(l - lat) < dist:
-                dist = np.abs(l-lat)
-                lat_index = i
-        lon_index = -1
-        dist = 1000
-        for i,l in enumerate(lon_arr):
-            if np.abs(l - lon) < dist:
-                dist = np.abs(l-lon)
-                lon_index = i
-        return lat_index, lon_index
+    def __find_entries(self, lat_arr, lon_arr, lats, lons) ->tuple[np.ndarray, np.ndarray]:
+        """
+        finds the closest row (latitude) and column (longitude) of the regular grid for each point
+        """
+        lat_arr = np.asarray(lat_arr, dtype=np.float64)
+        lon_arr = np.asarray(lon_arr, dtype=np.float64)
+        rows = np.abs(lat_arr[None, :] - np.asarray(lats, dtype=np.float64)[:, None]).argmin(axis=1)
+        cols = np.abs(lon_arr[None, :] - np.asarray(lons, dtype=np.float64)[:, None]).argmin(axis=1)
+        return rows, cols
 
     def get_pixel(self, lat:float, lon:float) -> dict:
-        lat_mat, lon_mat = self.get_lat_lon()
-        row, col = self.__find_entry(lat_mat, lon_mat, lat, lon)
-        if str(self.__prod.value).startswith("NWL"):
-            pixel = {
-                f"{str(self.__prod.value)}_JASMES": self.__handle_digital_number()[row, col],
-                f"{str(self.__prod.value).replace('NWLR', 'Rrs')}_JASMES": self.__handle_digital_number(rrs=True)[row, col]
-            }
-        else:
-            pixel = {
-                f"{str(self.__prod.value)}_JASMES": self.__handle_digital_number()[row, col],
-            }
-        return pixel
\ No newline at end of file
+        pixels = self.get_pixels(np.array([lat]), np.array([lon]))
+        return {k: v[0] for k, v in pixels.items()}
+
+    def get_pixels(self, lats:np.ndarray, lons:np.ndarray) -> dict:
+        lat_arr, lon_arr = self.get_lat_lon()
+        rows, cols = self.__find_entries(lat_arr, lon_arr, lats, lons)
+        prod = str(self.__prod.value)
+        pixels = {
+            f"{prod}_JASMES": self.__handle_digital_number(rows, cols),
+        }
+        if prod.startswith("NWL"):
+            pixels[f"{prod.replace('NWLR', 'Rrs')}_JASMES"] = self.__handle_digital_number(rows, cols, rrs=True)
+        return pixels
+
+    def close(self):
+        """
+        closes the netCDF file
+        """
+        self.__nc.close()
@@ -42,14 +42,27 @@ class JASMESMultiExtractor(Extractor):
         return path.split("/")[-1]
 
     def get_pixel(self, lat:float, lon:float) -> dict:
+        pixels = self.get_pixels(np.array([lat]), np.array([lon]))
+        return {k: v[0] for k, v in pixels.items()}
+
+    def get_pixels(self, lats:np.ndarray, lons:np.ndarray) -> dict:
         result = {}
+        # each product file is opened once for all the points
         for k in self.__paths.keys():
             prod = JASMESInternalProd(k)
             extractor = JASMESExtractor(self.__paths[k], prod)
-            pixel = extractor.get_pixel(lat, lon)
-            result.update(pixel)
+            try:
+                result.update(extractor.get_pixels(lats, lons))
+            finally:
+                extractor.close()
         return result
 
+    def close(self):
+        """
+        nothing to close, the product files are only open during get_pixels
+        """
+        pass
+
     @classmethod
     def extract_prod_name(self, key:str) -> str:
         return JASMESInternalProd(key[9:])
\ No newline at end of file
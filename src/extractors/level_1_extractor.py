@@ -9,18 +9,23 @@
 #
 
 from .extractor_interface import Extractor
-from .utils import find_entry
+from .utils import read_pixels
 import numpy as np
 
 
 
 class GPortalL1BExtractor(Extractor):
-        
-    def __handle_digital_number(self, prod_name:str) -> np.ndarray[float, float]:
+    __BANDS: list[str] = ['Lt01', 'Lt02', 'Lt03', 'Lt04', 'Lt05', 'Lt06', 'Lt07', 'Lt08', 'Lt09', 'Lt10', 'Lt11',
+                        'Rt01', 'Rt02', 'Rt03', 'Rt04', 'Rt05', 'Rt06', 'Rt07', 'Rt08', 'Rt09', 'Rt10', 'Rt11'
+                        ]
+
+    def __handle_digital_number(self, prod_name:str, rows:np.ndarray, cols:np.ndarray) -> np.ndarray[float]:
         """
-        Convert digital number to the desired product
+        Convert digital number to the desired product, only the pixels at (rows, cols) are read and converted
 
-        :prod_name str the desired product (Lt01 to Lt11 for radiance) or (Rt01 to Rt11 for reflectance)
+        | prod_name: str the desired product (Lt01 to Lt11 for radiance) or (Rt01 to Rt11 for reflectance)
+        | rows: np.ndarray rows of the pixels
+        | cols: np.ndarray columns of the pixels
         """
         # Get data
         radiance = prod_name.startswith("L")
@@ -28,9 +33,9 @@ class GPortalL1BExtractor(Extractor):
         else: real_prod_name = prod_name.replace('Rt', 'Lt_VN')
 
         data = self._h5['Image_data/' + real_prod_name]
-        rad_or_ref = data[:]
+        rad_or_ref = read_pixels(data, rows, cols)
 
-        errors = np.zeros(shape=rad_or_ref.shape, dtype=np.bool8)
+        errors = np.zeros(shape=rad_or_ref.shape, dtype=np.bool_)
 
         # Validate
         errors[rad_or_ref == data.attrs['Error_DN'][0]] = True
@@ -51,33 +56,14 @@ class GPortalL1BExtractor(Extractor):
         return rad_or_ref
 
     def get_pixel(self, lat:float, lon:float) -> dict:
-        lat_mat, lon_mat = self.get_lat_lon()
-        row, col, _ = find_entry(lat_mat, lon_mat, lat, lon)
-        pixel = {
-            "Lt01_GPORTAL": self.__handle_digital_number("Lt01")[row, col],
-            "Lt02_GPORTAL": self.__handle_digital_number("Lt02")[row, col],
-            "Lt03_GPORTAL": self.__handle_digital_number("Lt03")[row, col],
-            "Lt04_GPORTAL": self.__handle_digital_number("Lt04")[row, col],
-            "Lt05_GPORTAL": self.__handle_digital_number("Lt05")[row, col],
-            "Lt06_GPORTAL": self.__handle_digital_number("Lt06")[row, col],
-            "Lt07_GPORTAL": self.__handle_digital_number("Lt07")[row, col],
-            "Lt08_GPORTAL": self.__handle_digital_number("Lt08")[row, col],
-            "Lt09_GPORTAL": self.__handle_digital_number("Lt09")[row, col],
-            "Lt10_GPORTAL": self.__handle_digital_number("Lt10")[row, col],
-            "Lt11_GPORTAL": self.__handle_digital_number("Lt11")[row, col],
-            "Rt01_GPORTAL": self.__handle_digital_number("Rt01")[row, col],
-            "Rt02_GPORTAL": self.__handle_digital_number("Rt02")[row, col],
-            "Rt03_GPORTAL": self.__handle_digital_number("Rt03")[row, col],
-            "Rt04_GPORTAL": self.__handle_digital_number("Rt04")[row, col],
-            "Rt05_GPORTAL": self.__handle_digital_number("Rt05")[row, col],
-            "Rt06_GPORTAL": self.__handle_digital_number("Rt06")[row, col],
-            "Rt07_GPORTAL": self.__handle_digital_number("Rt07")[row, col],
-            "Rt08_GPORTAL": self.__handle_digital_number("Rt08")[row, col],
-            "Rt09_GPORTAL": self.__handle_digital_number("Rt09")[row, col],
-            "Rt10_GPORTAL": self.__handle_digital_number("Rt10")[row, col],
-            "Rt11_GPORTAL": self.__handle_digital_number("Rt11")[row, col],
-            "land_GPORTAL": self._h5["Image_data"]["Land_water_flag"][:][row, col]
-        }            
-        return pixel
-
+        pixels = self.get_pixels(np.array([lat]), np.array([lon]))
+        return {k: v[0] for k, v in pixels.items()}
 
+    def get_pixels(self, lats:np.ndarray, lons:np.ndarray) -> dict:
+        rows, cols, distances = self.find_pixels(lats, lons)
+        # each band is read once for all the points in the product, only the needed pixels
+        pixels = {}
+        for band in self.__BANDS:
+            pixels[band + "_GPORTAL"] = self.__handle_digital_number(band, rows, cols)
+        pixels["land_GPORTAL"] = read_pixels(self._h5["Image_data"]["Land_water_flag"], rows, cols)
+        return self.reject_far(pixels, distances)
@@ -9,7 +9,7 @@
 #
 
 from .extractor_interface import Extractor
-from .utils import find_entry
+from .utils import read_pixels
 import numpy as np
 
 class GPortalL2PExtractor(Extractor):
@@ -18,24 +18,26 @@ class GPortalL2PExtractor(Extractor):
                         'TURBIDW', 'SHALLOW', 'ITERFAILCDOM', 'CHLWARN', 'LOWNLW'
                         ]
         
-    def __digital_number_to_prod(self, prod_name:str) -> np.ndarray[float, float]:
+    def __digital_number_to_prod(self, prod_name:str, rows:np.ndarray, cols:np.ndarray) -> np.ndarray[float]:
         """
-        Convert digital number to the desired product
+        Convert digital number to the desired product, only the pixels at (rows, cols) are read and converted
 
-        :prod_name str the desired product (Lt01 to Lt11 for radiance) or (Rt01 to Rt11 for reflectance)
+        | prod_name: str the desired product (Lt01 to Lt11 for radiance) or (Rt01 to Rt11 for reflectance)
+        | rows: np.ndarray rows of the pixels
+        | cols: np.ndarray columns of the pixels
         """
         # Get product data
         real_prod_name = prod_name.upper()
         data = self._h5['Image_data/' + real_prod_name]
 
         # Validate
-        prod = data[:].astype(np.float32)
+        prod = read_pixels(data, rows, cols).astype(np.float32)
         if 'Error_DN' in data.attrs:
-            prod[prod == data.attrs['Error_DN'][0]] = np.NaN
+            prod[prod == data.attrs['Error_DN'][0]] = np.nan
         if 'Maximum_valid_DN' in data.attrs:
-            prod[prod > data.attrs['Maximum_valid_DN'][0]] = np.NaN
+            prod[prod > data.attrs['Maximum_valid_DN'][0]] = np.nan
         if 'Minimum_valid_DN' in data.attrs:
-            prod[prod < data.attrs['Minimum_valid_DN'][0]] = np.NaN
+            prod[prod < data.attrs['Minimum_valid_DN'][0]] = np.nan
 
         # Convert DN to physical value
         slope = data.attrs['Slope'][0]
@@ -47,7 +49,7 @@ class GPortalL2PExtractor(Extractor):
         """
         Calculates a dictionary mapping of flag->boolean that indicates each flag and if it's set or not
 
-        :flags_value int the integer value of the flag
+        :flags_value int or np.ndarray the integer value of the flag (one per point)
         """
         flags = {}
         order = 0
@@ -58,16 +60,17 @@ class GPortalL2PExtractor(Extractor):
         return flags
 
     def get_pixel(self, lat:float, lon:float) -> dict:
-        lat_mat, lon_mat = self.get_lat_lon()
-        row, col, distance = find_entry(lat_mat, lon_mat, lat, lon)
-        # print("=> matching point with distance^2 = %f" % (distance))
-        flags = self.__calculate_flags(self._h5["Image_data/QA_flag"][row, col])
-        pixel = {
-            "Chla_GPORTAL": self.__digital_number_to_prod("Chla")[row, col],
-            "aCDOM_412_GPORTAL": self.__digital_number_to_prod("CDOM")[row, col],
-            "TSM_GPORTAL": self.__digital_number_to_prod("TSM")[row, col],
-        }
-        pixel.update(flags)
-        return pixel
-
+        pixels = self.get_pixels(np.array([lat]), np.array([lon]))
+        return {k: v[0] for k, v in pixels.items()}
 
+    def get_pixels(self, lats:np.ndarray, lons:np.ndarray) -> dict:
+        rows, cols, distances = self.find_pixels(lats, lons)
+        # flags are decoded bitwise for all the points at once
+        flags = self.__calculate_flags(read_pixels(self._h5["Image_data/QA_flag"], rows, cols))
+        pixels = {
+            "Chla_GPORTAL": self.__digital_number_to_prod("Chla", rows, cols),
+            "aCDOM_412_GPORTAL": self.__digital_number_to_prod("CDOM", rows, cols),
+            "TSM_GPORTAL": self.__digital_number_to_prod("TSM", rows, cols),
+        }
+        pixels.update(flags)
+        return self.reject_far(pixels, distances)
@@ -10,7 +10,7 @@
 
 
 from .extractor_interface import Extractor
-from .utils import find_entry
+from .utils import read_pixels
 import numpy as np
 
 class GPortalL2RExtractor(Extractor):
@@ -19,24 +19,26 @@ class GPortalL2RExtractor(Extractor):
                         'EPSOUT', 'OVERITER', 'NEGNLW', 'HIGHWS', 'TURBIDW'
                         ]
         
-    def __digital_number_to_rrs(self, prod_name:str) -> np.ndarray[float, float]:
+    def __digital_number_to_rrs(self, prod_name:str, rows:np.ndarray, cols:np.ndarray) -> np.ndarray[float]:
         """
-        Convert digital number to the desired product
+        Convert digital number to the desired product, only the pixels at (rows, cols) are read and converted
 
-        :prod_name str the desired product (Lt01 to Lt11 for radiance) or (Rt01 to Rt11 for reflectance)
+        | prod_name: str the desired product (Lt01 to Lt11 for radiance) or (Rt01 to Rt11 for reflectance)
+        | rows: np.ndarray rows of the pixels
+        | cols: np.ndarray columns of the pixels
         """
         # Get Rrs data
         real_prod_name = prod_name.replace('Rrs', 'NWLR')
         data = self._h5['Image_data/' + real_prod_name]
 
         # Validate
-        rrs = data[:].astype(np.float32)
+        rrs = read_pixels(data, rows, cols).astype(np.float32)
         if 'Error_DN' in data.attrs:
-            rrs[rrs == data.attrs['Error_DN'][0]] = np.NaN
+            rrs[rrs == data.attrs['Error_DN'][0]] = np.nan
         if 'Maximum_valid_DN' in data.attrs:
-            rrs[rrs > data.attrs['Maximum_valid_DN'][0]] = np.NaN
+            rrs[rrs > data.attrs['Maximum_valid_DN'][0]] = np.nan
         if 'Minimum_valid_DN' in data.attrs:
-            rrs[rrs < data.attrs['Minimum_valid_DN'][0]] = np.NaN
+            rrs[rrs < data.attrs['Minimum_valid_DN'][0]] = np.nan
 
         # Convert DN to physical value
         slope = data.attrs['Rrs_slope'][0]
@@ -48,7 +50,7 @@ class GPortalL2RExtractor(Extractor):
         """
         Calculates a dictionary mapping of flag->boolean that indicates each flag and if it's set or not
 
-        :flags_value int the integer value of the flag
+        :flags_value int or np.ndarray the integer value of the flag (one per point)
         """
         flags = {}
         order = 0
@@ -59,22 +61,21 @@ class GPortalL2RExtractor(Extractor):
         return flags
 
     def get_pixel(self, lat:float, lon:float) -> dict:
-        lat_mat, lon_mat = self.get_lat_lon()
-        row, col, _ = find_entry(lat_mat, lon_mat, lat, lon)
-        # print("=> matching point with distance^2 = %f at %d %d" % (distance, row, col))
-        # print(lat_mat[row, col], lon_mat[row, col])
+        pixels = self.get_pixels(np.array([lat]), np.array([lon]))
+        return {k: v[0] for k, v in pixels.items()}
 
-        flags = self.__calculate_flags(self._h5["Image_data/QA_flag"][row, col])
-        pixel = {
-            "Rrs_380_GPORTAL": self.__digital_number_to_rrs("Rrs_380")[row, col],
-            "Rrs_412_GPORTAL": self.__digital_number_to_rrs("Rrs_412")[row, col],
-            "Rrs_443_GPORTAL": self.__digital_number_to_rrs("Rrs_443")[row, col],
-            "Rrs_490_GPORTAL": self.__digital_number_to_rrs("Rrs_490")[row, col],
-            "Rrs_530_GPORTAL": self.__digital_number_to_rrs("Rrs_530")[row, col],
-            "Rrs_565_GPORTAL": self.__digital_number_to_rrs("Rrs_565")[row, col],
-            "Rrs_670_GPORTAL": self.__digital_number_to_rrs("Rrs_670")[row, col],
+    def get_pixels(self, lats:np.ndarray, lons:np.ndarray) -> dict:
+        rows, cols, distances = self.find_pixels(lats, lons)
+        # flags are decoded bitwise for all the points at once
+        flags = self.__calculate_flags(read_pixels(self._h5["Image_data/QA_flag"], rows, cols))
+        pixels = {
+            "Rrs_380_GPORTAL": self.__digital_number_to_rrs("Rrs_380", rows, cols),
+            "Rrs_412_GPORTAL": self.__digital_number_to_rrs("Rrs_412", rows, cols),
+            "Rrs_443_GPORTAL": self.__digital_number_to_rrs("Rrs_443", rows, cols),
+            "Rrs_490_GPORTAL": self.__digital_number_to_rrs("Rrs_490", rows, cols),
+            "Rrs_530_GPORTAL": self.__digital_number_to_rrs("Rrs_530", rows, cols),
+            "Rrs_565_GPORTAL": self.__digital_number_to_rrs("Rrs_565", rows, cols),
+            "Rrs_670_GPORTAL": self.__digital_number_to_rrs("Rrs_670", rows, cols),
         }
-        pixel.update(flags)
-        return pixel
-
-
+        pixels.update(flags)
+        return self.reject_far(pixels, distances)
@@ -9,6 +9,10 @@
 #
 
 import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS = 6371.0088 # mean earth radius in km
+WINDOW_LIMIT = 1 << 18 # max pixels of a bounding window read at once, beyond that pixels are read one by one
 
 def distance_sqr(lat:float, lat_mat:np.ndarray[float, float], lon:float, lon_mat:np.ndarray[float, float])->np.ndarray[float, float]:
     lat_diff = (lat_mat - lat)
@@ -18,4 +22,160 @@ def distance_sqr(lat:float, lat_mat:np.ndarray[float, float], lon:float, lon_mat
 def find_entry(lat_mat:np.ndarray[float, float], lon_mat:np.ndarray[float, float], lat:float, lon:float)-> tuple[int, int, float]:
     dist = distance_sqr(lat, lat_mat, lon, lon_mat)
     row, col = np.where(dist == np.min(dist))
-    return row[0], col[0], dist[row, col]
\ No newline at end of file
+    return row[0], col[0], dist[row, col]
+def read_pixels(dataset, rows:np.ndarray[int], cols:np.ndarray[int])->np.ndarray:
+    """
+    reads only the pixels at (rows, cols) from a 2d h5py dataset or netCDF variable
+
+    the bounding window of the pixels is read when it is small (points close to each other),
+    otherwise each distinct pixel is read with its own point selection
+
+    | dataset: h5py.Dataset or netCDF4.Variable
+    | rows: rows of the pixels
+    | cols: columns of the pixels
+    """
+    rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+    if len(rows) == 0:
+        return np.ma.getdata(dataset[0:0, 0:0]).ravel()
+    row_min, row_max, col_min, col_max = rows.min(), rows.max(), cols.min(), cols.max()
+    if (row_max - row_min + 1) * (col_max - col_min + 1) <= WINDOW_LIMIT:
+        window = np.ma.getdata(dataset[row_min:row_max + 1, col_min:col_max + 1])
+        return window[rows - row_min, cols - col_min]
+    pixels, inverse = np.unique(np.stack((rows, cols)), axis=1, return_inverse=True)
+    values = np.array([np.ma.getdata(dataset[r, c]) for r, c in pixels.T])
+    return values[np.ravel(inverse)]
+
+def to_unit_xyz(lat:np.ndarray[float], lon:np.ndarray[float])->np.ndarray[float, float]:
+    """
+    converts latitude and longitude (degrees) to points on the unit sphere
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
+def chord_to_km(chord:np.ndarray[float])->np.ndarray[float]:
+    """
+    converts the chord length between two points on the unit sphere to the great-circle distance in km
+    """
+    chord = np.asarray(chord, dtype=np.float64)
+    return np.where(np.isfinite(chord), 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1)), np.inf)
+
+class GeoIndex:
+    """
+    spatial index over the pixels of a product for nearest pixel lookup
+
+    the pixels are indexed as points on the unit sphere so the nearest pixel is the nearest in great-circle distance
+    """
+    shape: tuple[int, int]
+
+    def __init__(self, lat_mat:np.ndarray[float, float], lon_mat:np.ndarray[float, float]):
+        """
+        builds the index once per product
+
+        | lat_mat: 2d array of the pixels latitude
+        | lon_mat: 2d array of the pixels longitude
+        """
+        self.shape = lat_mat.shape
+        lat = np.asarray(lat_mat).ravel()
+        lon = np.asarray(lon_mat).ravel()
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        self.__pixel_ids = np.flatnonzero(valid)
+        # no tree if the product has no located pixel (all NaN), nothing can be found
+        self.__tree = cKDTree(to_unit_xyz(lat[valid], lon[valid])) if len(self.__pixel_ids) else None
+
+    def query(self, lats:np.ndarray[float], lons:np.ndarray[float])-> tuple[np.ndarray[int], np.ndarray[int], np.ndarray[float]]:
+        """
+        finds the closest pixel for each (lat, lon) pair
+
+        | lats: latitudes of the points to look up
+        | lons: longitudes of the points to look up
+
+        returns the rows, columns and great-circle distances (km) with one entry per point
+        the distance is inf for points that cannot be located (e.g. NaN coordinates)
+        """
+        points = to_unit_xyz(np.atleast_1d(lats), np.atleast_1d(lons))
+        found = np.isfinite(points).all(axis=1)
+        chord = np.full(len(points), np.inf)
+        ids = np.zeros(len(points), dtype=np.int64)
+        if self.__tree is None:
+            return ids, ids.copy(), chord_to_km(chord)
+        if found.any():
+            chord[found], ids[found] = self.__tree.query(points[found])
+        rows, cols = np.unravel_index(self.__pixel_ids[ids], self.shape)
+        return rows, cols, chord_to_km(chord)
+
+def interpolate_tie_points(data:np.ndarray[float, float], interval:int, rows:np.ndarray[int], cols:np.ndarray[int])->np.ndarray[float]:
+    """
+    bilinear interpolation of the tie-point grid at the given full resolution pixels only,
+    gives the same values as Extractor.bilin_2d evaluated at (rows, cols)
+
+    | data: 2d tie-point grid (longitude must already be shifted to [0, 360) if it crosses the antimeridian)
+    | interval: int sampling interval of the product (e.g. 10)
+    | rows: full resolution rows
+    | cols: full resolution columns
+    """
+    data = np.concatenate((data, data[-1].reshape(1, -1)), axis=0)
+    data = np.concatenate((data, data[:, -1].reshape(-1, 1)), axis=1)
+    ratio = np.linspace(0, (interval - 1) / interval, interval, dtype=np.float32)
+    i, j = rows // interval, cols // interval
+    ratio_vertical, ratio_horizontal = ratio[rows % interval], ratio[cols % interval]
+    top = (1. - ratio_horizontal) * data[i, j] + ratio_horizontal * data[i, j + 1]
+    bottom = (1. - ratio_horizontal) * data[i + 1, j] + ratio_horizontal * data[i + 1, j + 1]
+    return (1. - ratio_vertical) * top + ratio_vertical * bottom
+
+class TiePointIndex:
+    """
+    spatial index over the tie-point grid of a product for nearest pixel lookup
+
+    only the tie points are indexed, the full resolution pixels are interpolated on demand
+    in the cells surrounding the closest tie point, memory is O(tie points) instead of O(pixels)
+    """
+    shape: tuple[int, int]
+
+    def __init__(self, lat_tie:np.ndarray[float, float], lon_tie:np.ndarray[float, float], interval:int, shape:tuple[int, int]):
+        """
+        | lat_tie: 2d tie-point grid of latitude
+        | lon_tie: 2d tie-point grid of longitude
+        | interval: int sampling interval of the product (e.g. 10)
+        | shape: (lines, pixels) of the full resolution image
+        """
+        self.shape = shape
+        self.__interval = interval
+        self.__lat = np.asarray(lat_tie)
+        self.__lon = np.asarray(lon_tie).copy()
+        # same antimeridian handling as Extractor.bilin_2d
+        self.__lon_shifted = np.nanmax(np.abs(self.__lon[:, :-1] - self.__lon[:, 1:])) > 180.
+        if self.__lon_shifted:
+            self.__lon[self.__lon < 0] = 360. + self.__lon[self.__lon < 0]
+        self.__tie_index = GeoIndex(self.__lat, self.__lon)
+        # full resolution offsets covering the cells on both sides of a tie point
+        offsets = np.arange(-interval, 2 * interval)
+        self.__row_offsets, self.__col_offsets = [o.ravel() for o in np.meshgrid(offsets, offsets, indexing="ij")]
+
+    def query(self, lats:np.ndarray[float], lons:np.ndarray[float])-> tuple[np.ndarray[int], np.ndarray[int], np.ndarray[float]]:
+        """
+        finds the closest pixel for each (lat, lon) pair
+
+        | lats: latitudes of the points to look up
+        | lons: longitudes of the points to look up
+
+        returns the rows, columns and great-circle distances (km) with one entry per point
+        """
+        lats, lons = np.atleast_1d(lats), np.atleast_1d(lons)
+        tie_rows, tie_cols, _ = self.__tie_index.query(lats, lons)
+        # candidate pixels: every full resolution pixel in the cells around the closest tie point
+        rows = tie_rows[:, None] * self.__interval + self.__row_offsets[None, :]
+        cols = tie_cols[:, None] * self.__interval + self.__col_offsets[None, :]
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        rows, cols = np.clip(rows, 0, self.shape[0] - 1), np.clip(cols, 0, self.shape[1] - 1)
+
+        lat = interpolate_tie_points(self.__lat, self.__interval, rows, cols)
+        lon = interpolate_tie_points(self.__lon, self.__interval, rows, cols)
+        if self.__lon_shifted:
+            lon = np.where(lon > 180., lon - 360., lon)
+        chord = np.linalg.norm(to_unit_xyz(lat, lon) - to_unit_xyz(lats, lons)[:, None, :], axis=-1)
+        chord[~inside | ~np.isfinite(chord)] = np.inf
+        best = chord.argmin(axis=1)
+        points = np.arange(len(lats))
+        return rows[points, best], cols[points, best], chord_to_km(chord[points, best])
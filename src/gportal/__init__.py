@@ -13,3 +13,5 @@ from src.gportal.gportal_types.gportal_geo import GPortalGeo
 from src.gportal.gportal_types.gportal_props import GPortalProperties
 from src.gportal.gportal_types.gportal_resolution import GPortalResolution
 from src.gportal.gportal_response import GPortalResponse
+from src.gportal.gportal_search_cache import GPortalSearchCache
+from src.gportal.gportal_footprint_index import GPortalFootprintIndex
@@ -9,12 +9,16 @@
 #
 
 import requests
+from requests.adapters import HTTPAdapter
+import io
 import json
 from enum import Enum
 
-from src.gportal.gportal_response import GPortalResponse, GPortalSearchResult
+from src.gportal.gportal_response import GPortalResponse, GPortalSearchResult, PARSE_ERRORS
 from src.gportal.gportal_types import GPortalResolution
-from src.args import TEMP_FOLDER
+from src.gportal.gportal_manifest import GPortalDownloadManifest
+from src.gportal.gportal_search_cache import GPortalSearchCache
+from src.utils import TokenBucket, backoff_delay
 import sys
 import time
 import itertools
@@ -33,6 +37,15 @@ DATASETS = {
     "L2P": "10002001"
 }
 
+# maximum number of results returned by one search request, larger searches are read page by page
+PAGE_SIZE = 1000
+# seconds to wait for the search server to answer (or to send the next bytes of the answer)
+SEARCH_TIMEOUT = 60
+# attempts to download a chunk before the download of its file fails
+DOWNLOAD_RETRIES = 5
+# bytes downloaded by one range request
+CHUNK_SIZE = 10000000
+
 
 class GPortalLvlProd(Enum):
     L1B = "L1B"
@@ -41,25 +54,36 @@ class GPortalLvlProd(Enum):
 
 
 class GportalApi:
-    def __init__(self, type: GPortalLvlProd):
+    def __init__(self, type: GPortalLvlProd, max_workers: int=20, max_bandwidth: float=None, search_cache: GPortalSearchCache=None):
         """
         API to talk to GPortal 
 
-        :type GPortalLvlProd L1B, L2R, or L2P
+        | type: GPortalLvlProd L1B, L2R, or L2P
+        | max_workers: int number of threads used to download in parallel (size of the connection pool),
+        |              shared by all the files being downloaded
+        | max_bandwidth: float total download rate limit in bytes per second (None for no limit)
+        | search_cache: GPortalSearchCache the search responses are read from and saved to (None for no cache)
         """
         self.fuel_csrf_token = "7726524198fa59edb5564f6d939d5b168f1ed1d3288434f000028e2d1d982695f88f11a240a224e75516bca03d3aa9ec38d8dbf918b329733c0329003e9ec10f"
-        self.token = ""
-        self.cookies = {
-            "fuel_csrf_token": self.fuel_csrf_token,
-            "iPlanetDirectoryPro": self.token
-        }
         self.baseurl = "https://gportal.jaxa.jp/gpr/search/catalog_records.json"
         self.headers = {
-            "Cookie": "fuel_csrf_token=%s" % self.fuel_csrf_token,
             "Origin": "https://gportal.jaxa.jp"
             # "Host": "gportal.jaxa.jp"
         }
+        self.max_workers = max_workers
+        # one keep-alive session for all the requests, the cookies set by GPortal are kept by the session
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+        self.session.cookies.set("fuel_csrf_token", self.fuel_csrf_token)
+        # one thread pool and one bandwidth budget for all the downloads of the job
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
+        self.__bandwidth = TokenBucket(max_bandwidth, burst=1024 * 1024) if max_bandwidth else None
         self.dataset = DATASETS[type.value] # select product
+        self.search_cache = search_cache
         self.done = False # used for the loading function
 
     def set_auth_details(self, cred:Path):
@@ -91,14 +115,49 @@ class GportalApi:
         | resolution  : GPortalResolution (250m or 1km)
         | verbose     : boolean 
         """
+        results = self.search_area(date, latitude, longitude, latitude, longitude, resolution, verbose)
+        if results is None:
+            return None
+        # filter the results to get a single product the best matchs the search criteria
+        return results.filter_results(latitude, longitude)
+
+    def search_area(self, date: str, min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: GPortalResolution, verbose: bool = True, start: int = 1)->GPortalSearchResult:
+        """
+        Searchs GPortal for all the products of a date intersecting an area,
+        the area is the bounding box of the given coordinates enlarged by 0.5 degree on each side.
+        Each point of the area can then be resolved with filter_results.
+        At most PAGE_SIZE results are returned, the next results are read by searching again from start.
+
+        | date        : string formated date YYYY/MM/DD
+        | min_lat     : float minimum latitude of the area
+        | min_lon     : float minimum longitude of the area
+        | max_lat     : float maximum latitude of the area
+        | max_lon     : float maximum longitude of the area
+        | resolution  : GPortalResolution (250m or 1km)
+        | verbose     : boolean 
+        | start       : int 1-based index of the first result (page), only the first page is cached
+
+        return None if the search failed
+        """
+        polygon = self.__construct_polygon_coordinates(min_lon, min_lat, max_lon, max_lat)
+        # the features that can't contain any of the points are dropped while parsing
+        area = (min_lat, min_lon, max_lat, max_lon)
+        cache = self.search_cache if start == 1 else None
+        # the same search was done before
+        if cache is not None:
+            content = cache.get(self.dataset, date, polygon, resolution.value)
+            if content is not None:
+                return GPortalSearchResult.parse(io.BytesIO(content), area)
+
         # construct initial request body
         body = {
             "dataset[0][id]": self.dataset,
             "obsdate[0][from]": date,
             "obsdate[0][to]": date,
             "mapProjection": "EQ",
-            "count": "1000",
-            "coordinates": self.__construct_polygon_coordinates(longitude, latitude),
+            "count": str(PAGE_SIZE),
+            "startIndex": str(start),
+            "coordinates": polygon,
             "dataset[0][Resolution][op]": "=",
             "dataset[0][Resolution][value][]": resolution.value,
             "fuel_csrf_token": self.fuel_csrf_token
@@ -109,7 +168,8 @@ class GportalApi:
             t.start()
         
         try: # send the request and wait for the response from GPortal
-            res = requests.post(self.baseurl, data=body, headers=self.headers)
+            # without the cache the response is parsed as it is received instead of being read whole
+            res = self.session.post(self.baseurl, data=body, stream=cache is None, timeout=SEARCH_TIMEOUT)
         except requests.exceptions.ConnectionError: # if connection error return None
             print(
                 "Connection aborted by GPortal, please try again with more specific search criteria.")
@@ -118,62 +178,111 @@ class GportalApi:
         
         # stop the loading message thread
         self.done = True 
-        time.sleep(0.2)
+        if verbose: time.sleep(0.2)
 
         if not res.ok:
+            res.close()
             return None
 
         # parse the results
         try:
-            results = json.loads(res.content)
-            results = GPortalSearchResult(results)
-        except:
+            if cache is None:
+                res.raw.decode_content = True
+                results = GPortalSearchResult.parse(res.raw, area)
+            else:
+                results = GPortalSearchResult.parse(io.BytesIO(res.content), area)
+        except PARSE_ERRORS:
+            # a malformed response, a connection lost while reading is raised (and retried by the caller)
             return None
-        # filter the results to get a single product the best matchs the search criteria
-        return results.filter_results(longitude, latitude)
+        finally:
+            res.close()
+        if cache is not None:
+            cache.put(self.dataset, date, polygon, resolution.value, res.content)
+        return results
 
-    def download(self, url: str, output_dir: Path, max_workers=20)->Path:
+    def download(self, url: str, output_dir: Path)->Path:
         """
         Downloads a single product from GPortal.
 
         | url        : string url of the product to download
         | output_dir : Path of the output directory to download the product
-        | max_workers: number of threads to download in parallel
 
+        returns the Path of the product, None if the download failed.
         Must call set_auth_details before calling this function.
         """
+        return self.download_many([url], output_dir)[0]
+
+    def download_many(self, urls: list[str], output_dir: Path, max_files: int=1)->list[Path]:
+        """
+        Downloads many products from GPortal, keeping up to max_files products in flight.
+        The chunks of all the files share the same thread pool (max_workers) and connection pool,
+        so the tail chunks of one file overlap with the next files.
+        A failed file doesn't stop the others, the failures are printed once all the files are done.
 
-        # setting up the thread pool
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        | urls       : list of string urls of the products to download
+        | output_dir : Path of the output directory to download the products
+        | max_files  : number of files downloaded at the same time
+
+        returns the Paths of the products in the order of the urls, None for the failed downloads.
+        Must call set_auth_details before calling this function.
+        """
         loop = asyncio.new_event_loop()
-        run = functools.partial(loop.run_in_executor, executor)
         asyncio.set_event_loop(loop)
+        try:
+            errors = loop.run_until_complete(self.__download_all(urls, output_dir, max_files))
+        finally:
+            loop.close()
+        paths = []
+        for url, error in zip(urls, errors):
+            if error is not None:
+                print("failed to download %s: %s" % (url.split("/")[-1], error))
+                paths.append(None)
+            else:
+                paths.append(Path(os.path.join(output_dir, url.split("/")[-1])))
+        return paths
+
+    def close(self):
+        """
+        releases the download threads and the connections
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        self.session.close()
+        if self.search_cache is not None:
+            self.search_cache.close()
+
+    def __get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """the thread pool shared by all the downloads (of all the threads), created on first use"""
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            return self.__executor
+
+    async def __download_all(self, urls: list[str], output_dir: Path, max_files: int)->list[Exception]:
+        """
+        schedules the downloads of all the urls with at most max_files in flight,
+        returns the error of each url (None for the downloaded files)
+        """
+        run = functools.partial(asyncio.get_running_loop().run_in_executor, self.__get_executor())
+        slots = asyncio.Semaphore(max(max_files, 1))
 
-        download = True
-        # run the download in multithreading
-        while download:
-            try:
-                loop.run_until_complete(
-                    self.__download(run, url, output_dir, chunk_size=10000000)
-                )
-                download = False
-            except requests.exceptions.Timeout:
-                print("retry download ..")
-                download = True
-            finally:
-                loop.close()
-
-        file_name = url.split("/")[-1]
-        output_file = Path(os.path.join(output_dir, file_name))
-        return output_file
+        async def download_file(url):
+            async with slots:
+                # the requests retry themselves, a raised error fails the file
+                await self.__download(run, url, output_dir, chunk_size=CHUNK_SIZE)
 
+        return await asyncio.gather(*[download_file(url) for url in urls], return_exceptions=True)
 
-    def __construct_polygon_coordinates(self, lon: float, lat: float):
-        """constructs a polygon of size 1x1 around the latitude and longitude"""
-        lon1 = str(lon - 0.5)
-        lon2 = str(lon + 0.5)
-        lat1 = str(lat - 0.5)
-        lat2 = str(lat + 0.5)
+    def __construct_polygon_coordinates(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+        """
+        constructs a polygon around the area enlarged by 0.5 on each side (1x1 around a single point),
+        clamped to the valid coordinates [-180, 180] x [-90, 90]
+        """
+        lon1 = str(max(min_lon - 0.5, -180))
+        lon2 = str(min(max_lon + 0.5, 180))
+        lat1 = str(max(min_lat - 0.5, -90))
+        lat2 = str(min(max_lat + 0.5, 90))
         polygon = "POLYGON((%s %s, %s %s, %s %s, %s %s, %s %s))" % (
             lon2, lat2, lon1, lat2, lon1, lat1, lon2, lat1, lon2, lat2)
         return polygon
@@ -202,61 +311,80 @@ class GportalApi:
         "fuel_csrf_token": self.fuel_csrf_token
         } 
 
-        res = requests.post(auth_url, body, headers = self.headers)
-        if res.ok:
-            # set the cookie
-            # cookies = res.headers["Set-Cookie"].split(";")
-            # for c in cookies:
-            #     if c.startswith("fuel_csrf_token"):
-            #         self.fuel_csrf_token = c.split("=")[1]
-            # body = res.json()
-            # self.token = body["key"]
-            # self.headers["Cookie"] = "fuel_csrf_token=%s; iPlanetDirectoryPro=%s"%(self.fuel_csrf_token, urllib.parse.quote_plus(self.token))
-            # print(res.json())
-            self.__set_cookies(res.cookies.get_dict())
-        elif res.status_code == 406:
+        # the session keeps the authentication cookies for the following requests
+        res = self.session.post(auth_url, body)
+        if res.status_code == 406:
             print("authentication failed!")
-        else:
+        elif not res.ok:
             print("somthing odd: %d"%res.status_code) 
     
     def __get_size(self, url:str):
         """
-        returns the size of the file to be downloaded
+        returns the size of the file to be downloaded,
+        a request that times out or loses its connection is retried after a backoff delay, at most DOWNLOAD_RETRIES attempts
         """
-        response = requests.head(url, headers=self.headers, stream=True)
+        for attempt in range(DOWNLOAD_RETRIES):
+            if attempt > 0:
+                time.sleep(backoff_delay(attempt))
+            try:
+                response = self.session.head(url, timeout=30)
+                break
+            except (requests.Timeout, requests.ConnectionError):
+                if attempt == DOWNLOAD_RETRIES - 1: raise
+                print("retry download ..")
         if response.status_code == 200:
             size = int(response.headers['content-length'])
-            self.__set_cookies(response.cookies.get_dict())
             return size
         else:
             print("failing to get size with response status code: %d"%response.status_code)
             # print(response.request.headers)
             return -1
 
-    def __download_range(self, url:str, start:int, end:int, output_path:Path):
-        """downloads a sequence of bytes from start to end."""
+    def __download_range(self, url:str, start:int, end:int, output_path:Path, manifest:GPortalDownloadManifest, pbar:tqdm):
+        """
+        downloads a sequence of bytes from start to end (included) and writes it at the same offset in the output file.
+        The range is recorded in the manifest only once all its bytes are received,
+        a failed attempt is retried after a backoff delay, at most DOWNLOAD_RETRIES attempts.
+        """
         headers = {'Range': f'bytes={start}-{end}'}
-        headers.update(self.headers)
-        done = False
-        while not done:
+        length = end - start + 1
+        error = None
+        for attempt in range(DOWNLOAD_RETRIES):
+            if attempt > 0:
+                time.sleep(backoff_delay(attempt))
             try:
-                response = requests.get(url, headers=headers, stream=True, timeout=5)
-                done = True
-            except Exception as e:
-                print("retrying")
-        self.__set_cookies(response.cookies.get_dict())
-        with open(output_path, 'wb') as f:
-            for part in response.iter_content(1024):
-                f.write(part)
-        self.pbar.update(1)
+                with self.session.get(url, headers=headers, stream=True, timeout=5) as response:
+                    # a server ignoring the range answers 200 with the whole file, the same bytes for a single chunk
+                    if response.status_code != 206 and not (response.status_code == 200 and length == manifest.size):
+                        error = "status code %d" % response.status_code
+                        continue
+                    received = 0
+                    # each thread writes its range through its own file handle
+                    with open(output_path, 'r+b') as f:
+                        f.seek(start)
+                        for part in response.iter_content(1024 * 64):
+                            received += len(part)
+                            if received > length:
+                                break # never write over the next range
+                            if self.__bandwidth is not None:
+                                self.__bandwidth.acquire(len(part))
+                            f.write(part)
+                    if received == length:
+                        manifest.mark_done(start, end)
+                        pbar.update(1)
+                        return
+                    error = "received %d bytes instead of %d" % (received, length)
+            except (requests.RequestException, OSError) as e:
+                error = str(e)
+        raise ConnectionError(f"failed to download bytes {start}-{end} of {url}: {error}")
 
     async def __download(self, run, url, output_dir:Path, chunk_size=2000000):
         """download the file by dividing it into chucks of 1mb and calling a thread for each chunck"""
         file_name = url.split("/")[-1]
         print("downloading file:", file_name, "into:", output_dir.absolute())
-        file_size = self.__get_size(url)
+        file_size = await run(self.__get_size, url)
         if file_size == -1:
-            return
+            raise ConnectionError(f"failed to get the size of {file_name}")
         print("downloading file:", file_name, "into:", output_dir.absolute(), "with size: ", file_size)
         output_file = Path(os.path.join(output_dir, file_name))
 
@@ -266,41 +394,43 @@ class GportalApi:
             if stats.st_size == file_size:
                 # print("file already exists!")
                 return
-        if file_size <= chunk_size:
-            chunks = [(0, file_size)]
-        else:
-            chunks = [(i*chunk_size, (i+1)*chunk_size-1) for i in range(file_size//chunk_size)]
-            if file_size%chunk_size > 0: chunks.append((chunks[-1][1]+1, chunks[-1][1]+file_size%chunk_size+1))
-
-        self.pbar = tqdm(total=len(chunks))
+        # the ranges (start, end) include their end byte
+        chunks = [(start, min(start + chunk_size, file_size) - 1) for start in range(0, file_size, chunk_size)]
+
+        # the chunks are written in place into a preallocated file that is renamed once complete,
+        # the manifest next to it records the completed chunks so an interrupted download resumes
+        part_file = Path(f"{output_file}.part")
+        manifest_file = Path(f"{output_file}.part.json")
+        manifest = None
+        if part_file.exists() and os.stat(part_file).st_size == file_size:
+            manifest = GPortalDownloadManifest.load(manifest_file, url, file_size)
+        if manifest is None:
+            manifest = GPortalDownloadManifest(manifest_file, url, file_size)
+            with open(part_file, 'wb') as f:
+                f.truncate(file_size)
+            manifest.save()
+        missing = manifest.missing(chunks)
+
+        pbar = tqdm(total=len(chunks), initial=len(chunks) - len(missing), desc=file_name)
         tasks = [
             run(
                 self.__download_range,
                 url,
                 start,
                 end,
-                os.path.join(TEMP_FOLDER, f'tmp_product.part{i}'),
+                part_file,
+                manifest,
+                pbar,
             )
-            for i, (start, end) in enumerate(chunks)
+            for start, end in missing
         ]
-        await asyncio.wait(tasks)
-
-        # collect the downloaded chuncks in one file
-        with open(output_file, 'wb') as o:
-            for i in range(len(chunks)):
-                chunk_path = os.path.join(TEMP_FOLDER, f'tmp_product.part{i}')
-
-                with open(chunk_path, 'rb') as s:
-                    o.write(s.read())
-
-                os.remove(chunk_path)
-
-    def __set_cookies(self, cookie_dict:dict):
-        for k in cookie_dict.keys():
-            self.cookies[k] = cookie_dict[k]
-        cookies_str  = ""
-        for k in self.cookies.keys():
-            cookies_str += "%s=%s; "%(k, self.cookies[k])
-        self.headers["Cookie"] = cookies_str
-
-    
\ No newline at end of file
+        await asyncio.gather(*tasks)
+        pbar.close()
+
+        if not manifest.covers(file_size):
+            # should not happen, start over on the next run
+            os.remove(part_file)
+            manifest.remove()
+            raise ConnectionError(f"the downloaded ranges don't cover the file, it will be downloaded again: {file_name}")
+        os.replace(part_file, output_file)
+        manifest.remove()
@@ -0,0 +1,146 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.gportal.gportal_response import GPortalResponse, OUTPUT_COLUMNS
+from src.utils import polygon_edges
+
+class GPortalFootprintIndex:
+    def __init__(self, path: Path):
+        """
+        local index of the GPortal products (footprint and output columns) harvested from the catalog.
+        The footprints are stored in sqlite with an R*Tree on their bounding boxes,
+        the harvested windows (date, area) are recorded so an interrupted harvest is resumed.
+        Safe to share between threads.
+
+        | path: Path of the sqlite database
+        """
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute(
+                """CREATE TABLE IF NOT EXISTS footprints (
+                    id INTEGER PRIMARY KEY,
+                    dataset TEXT, resolution TEXT, date TEXT, identifier TEXT,
+                    file_status TEXT, download_url TEXT, preview_url TEXT, cloud_coverage,
+                    geometry TEXT,
+                    UNIQUE (dataset, resolution, date, identifier)
+                )"""
+            )
+            self.__db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS footprints_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat)"
+            )
+            self.__db.execute(
+                """CREATE TABLE IF NOT EXISTS windows (
+                    dataset TEXT, resolution TEXT, date TEXT, area TEXT, time REAL, products INTEGER,
+                    PRIMARY KEY (dataset, resolution, date, area)
+                )"""
+            )
+
+    def is_harvested(self, dataset: str, resolution: str, date: str, area: str) -> bool:
+        """
+        tests if all the products of the window (date, area) are in the index
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT 1 FROM windows WHERE dataset=? AND resolution=? AND date=? AND area=?",
+                (dataset, resolution, date, area),
+            ).fetchone()
+        return row is not None
+
+    def put(self, dataset: str, resolution: str, date: str, area: str, results: list[GPortalResponse]):
+        """
+        adds the products found in a window (date, area) and records the window as harvested,
+        the products already in the index (found by an overlapping window) are kept once
+
+        | dataset: string GPortal dataset id
+        | resolution: string resolution of the products
+        | date: string formated date YYYY/MM/DD of the search
+        | area: string key of the searched area
+        | results: the products of all the pages of the window
+        """
+        rows = []
+        for r in results:
+            try:
+                record = r.to_record()
+            except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+                continue # malformed product
+            ring = r.geometry.coordinates
+            lons = [p[0] for p in ring]
+            lats = [p[1] for p in ring]
+            rows.append((record, json.dumps(ring), (min(lons), max(lons), min(lats), max(lats))))
+        with self.__lock, self.__db:
+            for record, geometry, box in rows:
+                cursor = self.__db.execute(
+                    "INSERT OR IGNORE INTO footprints VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (dataset, resolution, date, record["identifier"], record["file_status"],
+                     record["download_url"], record["preview_url"], record["cloud_coverage"], geometry),
+                )
+                if cursor.rowcount == 1:
+                    self.__db.execute("INSERT INTO footprints_rtree VALUES (?, ?, ?, ?, ?)", (cursor.lastrowid, *box))
+            self.__db.execute(
+                "INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?)",
+                (dataset, resolution, date, area, time.time(), len(rows)),
+            )
+
+    def dates(self, dataset: str, resolution: str) -> set[str]:
+        """
+        returns the dates harvested (at least partly) for the dataset
+        """
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT DISTINCT date FROM windows WHERE dataset=? AND resolution=?", (dataset, resolution)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def footprints(self, dataset: str, resolution: str, date: str, area: tuple[float, float, float, float]) -> tuple[pd.DataFrame, np.ndarray]:
+        """
+        returns the products of a date whose footprint overlaps the area, found with the R*Tree,
+        in the order they were harvested
+
+        | dataset: string GPortal dataset id
+        | resolution: string resolution of the products
+        | date: string formated date YYYY/MM/DD
+        | area: (min_lat, min_lon, max_lat, max_lon)
+
+        returns the output columns of the products (one row per product) and the edges of their footprints (see polygon_edges)
+        """
+        min_lat, min_lon, max_lat, max_lon = area
+        with self.__lock:
+            rows = self.__db.execute(
+                """SELECT f.identifier, f.file_status, f.download_url, f.preview_url, f.cloud_coverage, f.geometry
+                FROM footprints f JOIN footprints_rtree r ON r.id = f.id
+                WHERE r.min_lon <= ? AND r.max_lon >= ? AND r.min_lat <= ? AND r.max_lat >= ?
+                AND f.dataset=? AND f.resolution=? AND f.date=?
+                ORDER BY f.id""",
+                (max_lon, min_lon, max_lat, min_lat, dataset, resolution, date),
+            ).fetchall()
+        records = pd.DataFrame([r[:-1] for r in rows], columns=OUTPUT_COLUMNS, dtype=object)
+        return records, polygon_edges([json.loads(r[-1]) for r in rows])
+
+    def count(self, dataset: str, resolution: str) -> int:
+        """
+        returns the number of products of the dataset in the index
+        """
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT COUNT(*) FROM footprints WHERE dataset=? AND resolution=?", (dataset, resolution)
+            ).fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
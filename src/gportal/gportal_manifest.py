@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import json
+import os
+import threading
+from pathlib import Path
+from io import open
+
+
+class GPortalDownloadManifest:
+    path: Path
+    size: int
+    done: set[tuple[int, int]]
+
+    def __init__(self, path: Path, url: str, size: int):
+        """
+        sidecar manifest of a partial download recording the byte ranges already written
+
+        | path: Path of the manifest file (next to the partial file)
+        | url : str url of the product being downloaded
+        | size: int size of the product in bytes
+        """
+        self.path = Path(path)
+        self.url = url
+        self.size = size
+        self.done = set()
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path, url: str, size: int):
+        """
+        loads the manifest of a previous run, returns None if it is missing
+        or it does not describe the same product (url and size)
+        """
+        try:
+            with open(path, 'r') as f:
+                j = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if j.get("url") != url or j.get("size") != size:
+            return None
+        manifest = cls(path, url, size)
+        manifest.done = set((start, end) for start, end in j.get("done", []))
+        return manifest
+
+    def missing(self, chunks: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """
+        returns the chunks that are not downloaded yet
+        """
+        return [c for c in chunks if c not in self.done]
+
+    def covers(self, size: int) -> bool:
+        """
+        tests if the completed ranges (start, end included) cover the bytes [0, size) without a gap
+        """
+        position = 0
+        for start, end in sorted(self.done):
+            if start > position: return False
+            position = max(position, end + 1)
+        return position >= size
+
+    def mark_done(self, start: int, end: int):
+        """
+        records a completed range and saves the manifest (thread-safe)
+        """
+        with self.__lock:
+            self.done.add((start, end))
+            self.save()
+
+    def save(self):
+        """
+        writes the manifest to a temporary file then renames it so it is never left half written
+        """
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"url": self.url, "size": self.size, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """
+        deletes the manifest once the download is complete
+        """
+        if self.path.exists():
+            os.remove(self.path)
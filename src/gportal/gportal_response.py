@@ -8,11 +8,19 @@
 # The research was mainly supervised by Professor Salem Ibrahim Salem.
 #
 
-import numpy as np
 from src.gportal.gportal_types import GPortalProperties, GPortalGeo
-from src.utils import inside_polygon, min_distance
+from src.utils import polygon_edges, best_polygons
+from src.tables import read_table, save_table
+import json
 from pathlib import Path
 import pandas as pd
+try:
+    import ijson # streaming json parser, optional
+except ImportError:
+    ijson = None
+
+# errors of a malformed response, the network errors while reading the response are not included
+PARSE_ERRORS = (ValueError, KeyError, TypeError) + ((ijson.JSONError,) if ijson is not None else ())
 
 OUTPUT_COLUMNS = [
     "identifier",
@@ -26,17 +34,27 @@ OUTPUT_COLUMNS = [
 class GPortalResponse:
     type: str
     geometry: GPortalGeo
-    properties: GPortalProperties
+    __slots__ = ("type", "geometry", "__raw_properties", "__properties")
 
     def __init__(self, response:dict) -> None:
         """
-        parse the response of one result returned from GPortal
+        parse the response of one result returned from GPortal.
+        The geometry is parsed at once (all the results are filtered by it),
+        the properties are parsed on the first access (only the selected results are used)
         
         :response dictionary of the json response
         """
         self.type = str(response["type"])
         self.geometry = GPortalGeo(response["geometry"])
-        self.properties = GPortalProperties(response["properties"])
+        self.__raw_properties = response["properties"]
+        self.__properties = None
+
+    @property
+    def properties(self) -> GPortalProperties:
+        if self.__properties is None:
+            self.__properties = GPortalProperties(self.__raw_properties)
+            self.__raw_properties = None
+        return self.__properties
 
     def to_json(self) -> dict:
         """convert it to json"""
@@ -46,6 +64,18 @@ class GPortalResponse:
             "properties": self.properties.to_json()
         }
     
+    def to_record(self) -> dict:
+        """
+        returns the output columns of the response as a dict
+        """
+        return {
+            "identifier"    : self.properties.identifier,
+            "file_status"   : self.properties.status,
+            "download_url"  : self.properties.product.downloadUrl.geturl(),
+            "preview_url"   : self.properties.previews[0].url.geturl(),
+            "cloud_coverage": self.properties.meta.cloudCoverPercentage
+        }
+
     def to_dataframe(self, df:pd.DataFrame=None, index:int=None):
         """
         appends the response to a dataframe in index
@@ -57,35 +87,26 @@ class GPortalResponse:
             for c in OUTPUT_COLUMNS:
                 if c not in df.columns:
                     df[c] = []
+        record = self.to_record()
         if(index == df.size):
-            j = pd.DataFrame([{
-                "identifier"    : self.properties.identifier,
-                "file_status"   : self.properties.status,
-                "download_url"  : self.properties.product.downloadUrl.geturl(),
-                "preview_url"   : self.properties.previews[0].url.geturl(),
-                "cloud_coverage": self.properties.meta.cloudCoverPercentage
-            }], columns=OUTPUT_COLUMNS)
+            j = pd.DataFrame([record], columns=OUTPUT_COLUMNS)
             df = pd.concat([df, j], axis=0, ignore_index=True)
         else:
             index = df.index[index]
-            df.loc[index, "identifier"] = self.properties.identifier
-            df.loc[index, "file_status"]=self.properties.status
-            df.loc[index, "download_url"]=self.properties.product.downloadUrl.geturl()
-            df.loc[index, "preview_url"]=self.properties.previews[0].url.geturl()
-            df.loc[index, "cloud_coverage"]=self.properties.meta.cloudCoverPercentage
+            df.loc[index, list(record.keys())] = list(record.values())
         return df
     
 
     def save(self, path: Path):
         """
-        saves to csv file
+        saves to csv (or parquet, feather) file
         """
         try:
-            df = pd.read_csv(path, low_memory=True)
+            df = read_table(path)
         except:
             df = None
         df = self.to_dataframe(df)
-        df.to_csv(path, index=False)
+        save_table(df, path)
         return df
     def print(self):
         """
@@ -102,6 +123,16 @@ class GPortalResponse:
 
 
 
+def footprint_overlaps(feature: dict, area: tuple[float, float, float, float]) -> bool:
+    """
+    tests if the bounding box of the footprint of a feature overlaps the area (min_lat, min_lon, max_lat, max_lon)
+    """
+    min_lat, min_lon, max_lat, max_lon = area
+    ring = feature["geometry"]["coordinates"][0]
+    lons = [float(p[0]) for p in ring]
+    lats = [float(p[1]) for p in ring]
+    return min(lons) <= max_lon and max(lons) >= min_lon and min(lats) <= max_lat and max(lats) >= min_lat
+
 class GPortalSearchResult:
     results: list[GPortalResponse]
     def __init__(self, response:dict) -> None:
@@ -109,36 +140,69 @@ class GPortalSearchResult:
         parses the returned results from GPortal
         """
         self.results = [GPortalResponse(f) for f in response["features"]]
+        self.received = len(self.results) # number of features in the response, before the filtering of parse
+        self.__edges = None # edges of the footprints, packed on the first filter
+
+    @classmethod
+    def parse(cls, stream, area: tuple[float, float, float, float]=None) -> "GPortalSearchResult":
+        """
+        parses the results from the json response read from a binary file-like object.
+        The features are read one at a time (with ijson if installed, json otherwise)
+        and the features whose footprint doesn't overlap area are dropped as they arrive.
+
+        | stream: binary file-like object of the json response
+        | area  : (min_lat, min_lon, max_lat, max_lon) of the searched points, None to keep all the features
+        """
+        if ijson is not None:
+            features = ijson.items(stream, "features.item", use_float=True)
+        else:
+            features = json.load(stream)["features"]
+        received = 0
+        def overlapping(features):
+            nonlocal received
+            for f in features:
+                received += 1
+                if area is None or footprint_overlaps(f, area):
+                    yield f
+        result = cls({"features": overlapping(features)})
+        result.received = received
+        return result
 
     def filter_results(self, lat:float, lon:float) -> GPortalResponse:
         """
         Filters the results to make sure the given latitude and longitude are within the product coordinates.
-        Then selects the product in which the given latitude and longitude are closer to the center.
+        Then selects the product in which the given latitude and longitude are closer to the center
+        (the farthest from the product border).
 
         | lat         : float latitude
         | lon         : float longitude
 
         return None if no results
         """
-        if len(self.results) == 0: return None
-
-        filtered: list[GPortalResponse] = [] # contains all the products that INCLUDE the given lat and lon
-        for f in self.results:
-            poly = f.geometry.coordinates
-            poly = np.array(poly)
-            poly = poly.T
-            if inside_polygon(poly[0], poly[1], lon, lat):
-                filtered.append(f)
-        if len(filtered) > 1:
-            boarder_dis = []
-            point = [lat, lon]
-            for i in range(len(filtered)):
-                polygon = filtered[i].geometry.coordinates
-                boarder_dis.append(min_distance(point, polygon))
-            j = boarder_dis.index(max(boarder_dis)) # index of the product with lat and lon closest to center
-        else:
-            j = 0
-        if len(filtered) == 0: return None
-        return filtered[j]
+        return self.filter_many([lat], [lon])[0]
+
+    def filter_many(self, lats, lons) -> list[GPortalResponse]:
+        """
+        filter_results for many points at once, all the points are tested against all the products in one pass
+
+        | lats: array of float latitudes
+        | lons: array of float longitudes
+
+        returns the selected product of each point, None for the points outside all the products
+        """
+        if self.__edges is None:
+            self.__edges = polygon_edges([f.geometry.coordinates for f in self.results])
+        # the coordinates are (lon, lat) pairs
+        best = best_polygons(self.__edges, lons, lats)
+        selected = []
+        for j in best:
+            f = self.results[j] if j >= 0 else None
+            if f is not None:
+                try:
+                    f.properties # parsed on the first access, a malformed result is not selected
+                except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+                    f = None
+            selected.append(f)
+        return selected
     
     
\ No newline at end of file
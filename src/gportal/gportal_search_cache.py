@@ -0,0 +1,63 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+class GPortalSearchCache:
+    def __init__(self, path: Path, expiry: float=7 * 24 * 3600):
+        """
+        on-disk cache of the raw GPortal search responses (catalog_records.json),
+        keyed by (dataset, date, polygon, resolution). Safe to share between threads.
+
+        | path: Path of the sqlite database
+        | expiry: float number of seconds a response is valid
+        """
+        self.path = path
+        self.expiry = expiry
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute(
+                """CREATE TABLE IF NOT EXISTS searches (
+                    dataset TEXT, date TEXT, polygon TEXT, resolution TEXT,
+                    time REAL, response BLOB,
+                    PRIMARY KEY (dataset, date, polygon, resolution)
+                )"""
+            )
+
+    def get(self, dataset: str, date: str, polygon: str, resolution: str) -> bytes:
+        """
+        returns the cached response of the search, None if not cached or expired
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT time, response FROM searches WHERE dataset=? AND date=? AND polygon=? AND resolution=?",
+                (dataset, date, polygon, resolution),
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.expiry:
+            return None
+        return row[1]
+
+    def put(self, dataset: str, date: str, polygon: str, resolution: str, response: bytes):
+        """
+        caches the response of the search
+        """
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?)",
+                (dataset, date, polygon, resolution, time.time(), response),
+            )
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
@@ -14,6 +14,7 @@ from enum import Enum
 class GPortalGeo:
     type: str
     coordinates: list[list[float]]
+    __slots__ = ("type", "coordinates")
 
     def __init__(self, response:dict) -> None:
         """
@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from src.gportal import GportalApi, GPortalLvlProd, GPortalResolution, GPortalFootprintIndex
+from src.gportal.gportal_api import PAGE_SIZE
+from src.search import with_retry
+from src.utils import TokenBucket
+
+def harvest_tiles(bbox: list[float], tile: float) -> list[tuple[float, float, float, float]]:
+    """
+    splits the area into tiles searched separately, each search returns the products of one tile
+
+    | bbox: [min_lat, min_lon, max_lat, max_lon] of the area
+    | tile: float size of the tiles in degrees, 0 to search the whole area at once
+
+    returns the list of the (min_lat, min_lon, max_lat, max_lon) of the tiles
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if not tile:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    lats = np.append(np.arange(min_lat, max_lat, tile), max_lat)
+    lons = np.append(np.arange(min_lon, max_lon, tile), max_lon)
+    return [
+        (float(lats[i]), float(lons[j]), float(lats[i + 1]), float(lons[j + 1]))
+        for i in range(len(lats) - 1) for j in range(len(lons) - 1)
+    ]
+
+def harvest(args: Namespace):
+    """
+    Harvests the GPortal catalog into the local footprint index:
+    every product of a date range and an area is stored with its footprint,
+    the search can then match the csv against the index without talking to GPortal.
+    The dates and tiles of the area are searched one by one (page by page when a search has more
+    than 1000 products), the windows already harvested are skipped.
+    arguments provided through json file or cmdline arguments:
+        - product: L1B, L2R or L2P
+        - footprint_index: path of the sqlite index
+        - start_date: first date, YYYY/MM/DD
+        - end_date: last date, YYYY/MM/DD, default: start_date
+        - bbox: min_lat min_lon max_lat max_lon of the area, default: the whole globe
+        - harvest_tile: size in degrees of the tiles searched separately, default: 10
+        - search_workers: number of windows searched at once, default: 1
+        - rate_limit: maximum number of search requests per second
+    """
+    api = GportalApi(GPortalLvlProd(args.product), max_workers=args.search_workers)
+    index = GPortalFootprintIndex(args.footprint_index)
+    resolution = GPortalResolution.H
+    limiter = TokenBucket(args.rate_limit, burst=args.search_workers) if args.rate_limit else None
+
+    dates = pd.date_range(args.start_date, args.end_date or args.start_date).strftime("%Y/%m/%d")
+    tiles = harvest_tiles(args.bbox, args.harvest_tile)
+    windows = [
+        (date, tile) for date in dates for tile in tiles
+        if not index.is_harvested(api.dataset, resolution.value, date, str(tile))
+    ]
+
+    print("=============================")
+    print("Harvesting GPortal catalog...")
+    print("=============================")
+    print(f"> {len(windows)} of {len(dates) * len(tiles)} windows (date, tile) to harvest")
+
+    def harvest_window(window) -> bool:
+        date, tile = window
+        results, start = [], 1
+        while True:
+            try:
+                page = with_retry(lambda: api.search_area(date, *tile, resolution, verbose=False, start=start), limiter)
+            except Exception:
+                page = None
+            if page is None:
+                return False # failed, the window is harvested again by the next run
+            results.extend(page.results)
+            if page.received < PAGE_SIZE:
+                break
+            start += page.received
+        index.put(api.dataset, resolution.value, date, str(tile), results)
+        return True
+
+    failed = 0
+    pbar = tqdm(total=len(windows), position=0, leave=True)
+    with ThreadPoolExecutor(max_workers=args.search_workers) as executor:
+        for window, done in zip(windows, executor.map(harvest_window, windows)):
+            failed += not done
+            pbar.set_description(window[0])
+            pbar.update(1)
+    pbar.close()
+
+    print(f"> {index.count(api.dataset, resolution.value)} products in {args.footprint_index}")
+    if failed:
+        print(f"> {failed} windows failed, run again to harvest them")
+    api.close()
+    index.close()
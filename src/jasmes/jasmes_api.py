@@ -13,13 +13,16 @@ from enum import Enum
 import json
 import os
 from pathlib import Path
-from ftplib import FTP
+from ftplib import FTP, error_perm
 from dateutil import parser
 import numpy as np
 from tqdm import tqdm
 
 from src.jasmes.jasmes_types import JASMESResponse
 from src.jasmes.jasmes_cooredinates import COORDINATES
+from src.jasmes.jasmes_ftp_pool import FTPPool, JASMES_HOST, connect
+from src.jasmes.jasmes_listing_cache import JASMESListingCache
+from src.args import CACHE_FOLDER
 from io import open
 import posixpath
 
@@ -36,14 +39,44 @@ class JASMESInternalProd(Enum):
     TSM                 = "TSM"
     SST                 = "SST"
 
+BLOCK_SIZE = 1024 * 1024 # bytes per ftp read and per file write
+# seconds a missing date directory (not published yet) is remembered before listing it again
+MISSING_LISTING_TTL = 600
+
+# bounds of the 16 boxes (lat, lon), computed once
+BOX_MIN = np.array(COORDINATES).min(axis=1)
+BOX_MAX = np.array(COORDINATES).max(axis=1)
+
+def find_boxes(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    finds the JASMES box of many points at once
+
+    | lats: array of latitudes
+    | lons: array of longitudes
+
+    returns the box ids (1 to 16, the first box containing the point) or -1 if the point is in no box
+    """
+    points = np.stack([np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)], axis=-1)
+    inside = ((points[:, None, :] >= BOX_MIN) & (points[:, None, :] <= BOX_MAX)).all(axis=2)
+    return np.where(inside.any(axis=1), inside.argmax(axis=1) + 1, -1)
+
 class JasmesApi:
     __logged_in = False
     __ftp: FTP
-    def __init__(self, verbose: bool=False):
+    def __init__(self, verbose: bool=False, host: str=JASMES_HOST, max_connections: int=4, listing_ttl: float=24):
         """
         API to talk to JASMES FTP server 
+
+        | verbose: boolean, shows the download progress of each file
+        | host: string host name of the ftp server, optionally followed by :port
+        | max_connections: int number of ftp connections used to download in parallel
+        | listing_ttl: float number of hours the directory listings are cached (on disk) for the search
         """
-        self.__ftp = FTP("apollo.eorc.jaxa.jp")
+        self.__ftp = connect(host)
+        self.__listings = JASMESListingCache(CACHE_FOLDER / f"jasmes_listings_{host.replace(':', '_')}.json", listing_ttl * 3600)
+        self.__pool = None
+        self.host = host
+        self.max_connections = max_connections
         self.verbose = verbose
 
     def set_prod(self, prod: JASMESInternalProd):
@@ -67,6 +100,8 @@ class JasmesApi:
         f.close()
         self.account = j["account"]
         self.password = j["password"]
+        # the downloads go through their own connections, the search keeps the main connection
+        self.__pool = FTPPool(self.host, self.account, self.password, self.max_connections)
 
     def search(self, date: str, latitude: float, longitude: float, resolution=None, verbose: bool = True):
         """
@@ -78,131 +113,147 @@ class JasmesApi:
         | verbose     : boolean 
         """
         parsed_date = parser.parse(date)
-        if not self.__login():
-            return None
-        if not self.__go_to_product_directory():
-            return None
-        if not self.__go_to_date(parsed_date):
-            return None
+        product_directory = self.__product_directory()
         box_id = self.__find_square(latitude, longitude)
         if box_id == -1:
             return None
-        
-        files = self.__ftp.nlst()
+        directory = posixpath.join(product_directory, self.__date_directory(parsed_date))
+        # the listing of a (product, date) is fetched once and shared by all the boxes
+        files = self.__list_directory(directory)
+        if files is None:
+            return None
+
         file = None
         fileSize = 0
-        for f in files:
+        for f in files.keys():
             if f.endswith(f"{str(box_id).zfill(2)}.nc"):
-                self.__ftp.voidcmd("TYPE I")
-                size = self.__ftp.size(f)
+                size = files[f]
+                if size is None:
+                    # listed without sizes (no MLSD support)
+                    if not self.__login():
+                        return None
+                    self.__ftp.voidcmd("TYPE I")
+                    size = self.__ftp.size(posixpath.join(directory, f))
+                    self.__listings.set_size(directory, f, size)
                 if size > fileSize:
                     file = f
                     fileSize = size
         if file == None:
             return None
-        dir = posixpath.join(self.__ftp.pwd(), file)
-        return JASMESResponse(file, COORDINATES[box_id], fileSize, dir)
+        dir = posixpath.join(directory, file)
+        return JASMESResponse(file, COORDINATES[box_id - 1], fileSize, dir)
         
         
     def download(self, ftp_path: str, output_dir: Path)->Path:
         """
         Downloads a single product from JASMES using ftp.
+        Safe to call from many threads, each download borrows a connection from the pool.
 
         | ftp_path   : string path of the product to download on the ftp server
         | output_dir : Path of the output directory to download the product
 
+        Must call set_auth_details before calling this function.
         """
-        if not self.__login():
-            return None
         file_name = ftp_path.split("/")[-1]
-        dir = "/".join(ftp_path.split("/")[:-1])
-        self.__ftp.cwd(dir)
-        self.__ftp.voidcmd("TYPE I")
-        size = self.__ftp.size(file_name)
-        nblocks = (size // 8192) + (size % 8192 != 0)
-        if self.verbose:
-            self.__pbar = tqdm(total=nblocks, unit="block")
-            self.__pbar.set_description(f"{file_name}")
-        # don't download if file already exists
         output_file = Path(os.path.join(output_dir, file_name))
-        if output_file.exists():
-            stats = os.stat(output_file)
-            if stats.st_size == size:
-                if self.verbose:
-                    self.__pbar.update(nblocks)
-                    self.__pbar.close()
-                return output_file
-            
-        self.__output = open(output_file, "wb")
-        
-        
-        self.__ftp.retrbinary("RETR %s"%file_name, self.__download_callback)
-        self.__output.close()
+        part_file = Path(f"{output_file}.part")
+        with self.__pool.connection() as ftp:
+            size = ftp.size(ftp_path)
+            # don't download if file already exists
+            if output_file.exists():
+                stats = os.stat(output_file)
+                if stats.st_size == size:
+                    return output_file
+            pbar = None
+            if self.verbose:
+                pbar = tqdm(total=size, unit="B", unit_scale=True, desc=file_name)
+            # large blocks and a buffered file keep the transfer bound by the bandwidth
+            with open(part_file, "wb", buffering=BLOCK_SIZE) as f:
+                def write(data: bytes):
+                    f.write(data)
+                    if pbar is not None: pbar.update(len(data))
+                ftp.retrbinary("RETR %s"%ftp_path, write, blocksize=BLOCK_SIZE)
+            if pbar is not None: pbar.close()
+        os.replace(part_file, output_file)
         return output_file
         
     def close(self):
         self.__ftp.quit()
+        if self.__pool is not None:
+            self.__pool.close()
 
-    def __download_callback(self, data:bytes)->object:
-        if self.verbose:
-            self.__pbar.update(1)
-        return self.__output.write(data)
-
-    def __go_to_product_directory(self)->bool:
+    def __product_directory(self)->str:
         if self.__prod == JASMESInternalProd.NWLR_380:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_380")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_380"
         elif self.__prod == JASMESInternalProd.NWLR_412:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_412")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_412"
         elif self.__prod == JASMESInternalProd.NWLR_443:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_443")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_443"
         elif self.__prod == JASMESInternalProd.NWLR_490:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_490")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_490"
         elif self.__prod == JASMESInternalProd.NWLR_530:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_530")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_530"
         elif self.__prod == JASMESInternalProd.NWLR_565:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_565")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_565"
         elif self.__prod == JASMESInternalProd.NWLR_670:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_670")
+            return "/pub/SGLI_NRT/L2_Ocean_atmospheric_correction/NWLR_670"
         elif self.__prod == JASMESInternalProd.CHLA:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_In-water_properties/CHLA")
+            return "/pub/SGLI_NRT/L2_In-water_properties/CHLA"
         elif self.__prod == JASMESInternalProd.CDOM:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_In-water_properties/CDOM")
+            return "/pub/SGLI_NRT/L2_In-water_properties/CDOM"
         elif self.__prod == JASMESInternalProd.TSM:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_In-water_properties/TSM")
+            return "/pub/SGLI_NRT/L2_In-water_properties/TSM"
         elif self.__prod == JASMESInternalProd.SST:
-            response = self.__ftp.cwd("/pub/SGLI_NRT/L2_Thermal_analysis/SST")
+            return "/pub/SGLI_NRT/L2_Thermal_analysis/SST"
         else:
             print("Product %s is not supported yet.."%self.__prod.value)
             exit(1)
-        if not response.startswith("250"):
-            print("cannot open product directory")
-            return False
-        else: return True
+
+    def __list_directory(self, directory:str)->dict:
+        """
+        returns {file name: size} of the files of the directory, the size is None if the server
+        doesn't support MLSD. The listings are cached, a cached listing costs no round-trip.
+        """
+        files = self.__listings.get(directory)
+        if files is not None:
+            return files
+        if not self.__login():
+            return None
+        try:
+            # one round-trip for the names and the sizes
+            files = {
+                name: int(facts["size"]) if "size" in facts else None
+                for name, facts in self.__ftp.mlsd(directory, ["type", "size"])
+                if facts.get("type", "file") == "file"
+            }
+        except error_perm as e:
+            if str(e).startswith("50"):
+                # MLSD not supported, the sizes are requested only for the matching files
+                files = self.__list_names(directory)
+            else:
+                files = None
+        if files is None:
+            # the date is not available (yet), the directory is listed again after a short time
+            self.__listings.put(directory, {}, ttl=MISSING_LISTING_TTL)
+            return {}
+        self.__listings.put(directory, files)
+        return files
+
+    def __list_names(self, directory:str)->dict:
+        try:
+            self.__ftp.cwd(directory)
+            return {posixpath.basename(f): None for f in self.__ftp.nlst()}
+        except error_perm:
+            return None
+
     def __find_square(self, lat:float, lon:float)->int:
-        i = 1
-        while(i <= 16):
-            box = np.array(COORDINATES[i-1]).T
-            max_lat = np.array(box[0]).max()
-            min_lat = np.array(box[0]).min()
-            max_lon = np.array(box[1]).max()
-            min_lon = np.array(box[1]).min()
-            if lat >= min_lat and lat <= max_lat and lon >= min_lon and lon <= max_lon:
-                return i
-            i += 1
-        return -1
-
-    def __go_to_date(self, date:datetime)->bool:
+        return int(find_boxes(np.array([lat]), np.array([lon]))[0])
+
+    def __date_directory(self, date:datetime)->str:
         year    = str(date.year).zfill(4)
         month   = str(date.month).zfill(2)
         day     = str(date.day).zfill(2)
-        try:
-            response = self.__ftp.cwd(f"{year}/{month}/{day}")
-            if response.startswith("250"): return True
-            else:
-                print("cannot find date")
-                return False
-        except:
-            return False
+        return f"{year}/{month}/{day}"
         
     def __login(self):
         if not self.__logged_in:
@@ -211,5 +262,6 @@ class JasmesApi:
                 print("login failed")
                 return False
             else:
+                self.__logged_in = True
                 return True
         else: return True
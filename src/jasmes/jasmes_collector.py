@@ -11,13 +11,22 @@
 from enum import Enum
 import json
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from src.jasmes.jasmes_api import JASMESInternalProd, JasmesApi
+from src.jasmes.jasmes_ftp_pool import JASMES_HOST
 from src.jasmes.jasmes_types.jasmes_collection import JASMESCollection
 from tqdm import tqdm
 
 class JasmesCollector(JasmesApi):
-    def __init__(self):
-        super().__init__()         
+    def __init__(self, host: str=JASMES_HOST, max_connections: int=4, listing_ttl: float=24):
+        """
+        collects the 11 products (NWLR, CDOM, CHLA, TSM, SST) of a JASMES box
+
+        | host: string host name of the ftp server, optionally followed by :port
+        | max_connections: int number of files downloaded in parallel
+        | listing_ttl: float number of hours the directory listings are cached for the search
+        """
+        super().__init__(host=host, max_connections=max_connections, listing_ttl=listing_ttl)
 
     def search(self, date: str, latitude: float, longitude: float, resolution=None, verbose: bool = True):
             # NWLR
@@ -61,13 +70,21 @@ class JasmesCollector(JasmesApi):
                 ftp_path_SST,
                 )
     def download(self, ftp_paths: dict, output_dir: Path) -> Path:
-        pbar = tqdm(total=11, unit="files")
-        paths = {}
-        for k in ftp_paths.keys():
+        """
+        downloads the files of ftp_paths in parallel (max_connections at once)
+
+        | ftp_paths: dict of the ftp paths of the products
+        | output_dir: Path of the output directory to download the products
+        """
+        pbar = tqdm(total=len(ftp_paths), unit="files")
+        download = super().download
+        def download_file(k):
+            path = download(ftp_paths[k], output_dir)
             pbar.set_description(f"{ftp_paths[k].split('/')[-1]}")
-            path = super().download(ftp_paths[k], output_dir)
-            paths[k] = str(path)
             pbar.update(1)
+            return k, str(path)
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            paths = dict(executor.map(download_file, ftp_paths.keys()))
         pbar.close()
 
         return json.dumps(paths)
\ No newline at end of file
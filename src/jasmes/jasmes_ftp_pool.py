@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2024 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+from contextlib import contextmanager
+from ftplib import FTP, error_temp, error_reply
+import queue
+import threading
+
+JASMES_HOST = "apollo.eorc.jaxa.jp"
+
+def connect(host: str) -> FTP:
+    """
+    opens a control connection to the ftp server
+
+    | host: string host name of the server, optionally followed by :port (ex: localhost:2121)
+    """
+    name, _, port = host.partition(":")
+    ftp = FTP()
+    ftp.connect(name, int(port) if port else 21)
+    return ftp
+
+class FTPPool:
+    def __init__(self, host: str, account: str, password: str, size: int=4):
+        """
+        pool of logged in ftp connections shared by the threads of a job.
+        The connections are opened on demand and kept open between the transfers.
+
+        | host: string host name of the server, optionally followed by :port
+        | account: the ftp account
+        | password: the ftp password
+        | size: maximum number of connections opened at once
+        """
+        self.host = host
+        self.account = account
+        self.password = password
+        self.size = size
+        self.__idle = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        """
+        borrows a logged in connection, blocks while all the connections are in use.
+        An idle connection is checked with NOOP before it is handed out, the connections
+        closed by the server while idle are replaced by new ones.
+        A connection that raised is dropped, a new one is opened the next time.
+        """
+        with self.__slots:
+            ftp = self.__take()
+            try:
+                yield ftp
+            except:
+                self.__drop(ftp)
+                raise
+            self.__idle.put(ftp)
+
+    def close(self):
+        """closes all the idle connections"""
+        while True:
+            try:
+                ftp = self.__idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except:
+                self.__drop(ftp)
+
+    def __take(self) -> FTP:
+        while True:
+            try:
+                ftp = self.__idle.get_nowait()
+            except queue.Empty:
+                return self.__open()
+            try:
+                ftp.voidcmd("NOOP")
+                return ftp
+            except (error_temp, error_reply, EOFError, OSError):
+                # timed out or closed by the server (421) while idle
+                self.__drop(ftp)
+
+    def __open(self) -> FTP:
+        ftp = connect(self.host)
+        response = ftp.login(self.account, self.password)
+        if not response.startswith("230"):
+            ftp.close()
+            raise ConnectionError("login failed")
+        ftp.voidcmd("TYPE I")
+        return ftp
+
+    def __drop(self, ftp: FTP):
+        try:
+            ftp.close()
+        except:
+            pass
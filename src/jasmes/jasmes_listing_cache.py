@@ -0,0 +1,76 @@
+#
+# Copyright (c) 2024 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+class JASMESListingCache:
+    def __init__(self, path: Path=None, ttl: float=24 * 3600):
+        """
+        cache of the JASMES directory listings: file names and sizes of a (product directory, date)
+
+        | path: Path of the json file the cache is persisted to, None to keep it in memory only
+        | ttl: float number of seconds a listing is valid
+        """
+        self.path = path
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__listings = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.__listings = json.load(f)
+            except:
+                # corrupt cache, start over
+                self.__listings = {}
+
+    def get(self, directory: str) -> dict:
+        """
+        returns the listing {file name: size or None} of the directory, None if not cached or expired
+        """
+        with self.__lock:
+            entry = self.__listings.get(directory)
+            if entry is None or time.time() - entry["time"] > entry.get("ttl", self.ttl):
+                return None
+            return entry["files"]
+
+    def put(self, directory: str, files: dict, ttl: float=None):
+        """
+        caches the listing {file name: size or None} of the directory
+
+        | ttl: float number of seconds this listing is valid, None for the ttl of the cache
+        """
+        with self.__lock:
+            entry = {"time": time.time(), "files": files}
+            if ttl is not None:
+                entry["ttl"] = ttl
+            self.__listings[directory] = entry
+            self.__save()
+
+    def set_size(self, directory: str, file: str, size: int):
+        """
+        records the size of a file of a cached listing (listings without sizes are filled on demand)
+        """
+        with self.__lock:
+            entry = self.__listings.get(directory)
+            if entry is None: return
+            entry["files"][file] = size
+            self.__save()
+
+    def __save(self):
+        if self.path is None: return
+        # write to a temporary file then rename so an interrupted save doesn't corrupt the cache
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.__listings, f)
+        os.replace(tmp, self.path)
@@ -103,6 +103,24 @@ class JASMESCollection:
         })
 
 
+    def to_record(self) -> dict:
+        """
+        returns the output columns of the response as a dict
+        """
+        return {
+            "ftp_path_NWLR_380": self.ftp_path_380,
+            "ftp_path_NWLR_412": self.ftp_path_412,
+            "ftp_path_NWLR_443": self.ftp_path_443,
+            "ftp_path_NWLR_490": self.ftp_path_490,
+            "ftp_path_NWLR_530": self.ftp_path_530,
+            "ftp_path_NWLR_565": self.ftp_path_565,
+            "ftp_path_NWLR_670": self.ftp_path_670,
+            "ftp_path_CDOM": self.ftp_path_CDOM,
+            "ftp_path_CHLA": self.ftp_path_CHLA,
+            "ftp_path_TSM": self.ftp_path_TSM,
+            "ftp_path_SST": self.ftp_path_SST,
+        }
+
     def to_dataframe(self, df:pd.DataFrame=None, index:int=None):
         """
         appends the response to a dataframe in index
@@ -114,32 +132,11 @@ class JASMESCollection:
             for c in OUTPUT_COLUMNS:
                 if c not in df.columns:
                     df[c] = []
+        record = self.to_record()
         if(index == df.size):
-            j = pd.DataFrame([{
-                "ftp_path_NWLR_380": self.ftp_path_380,
-                "ftp_path_NWLR_412": self.ftp_path_412,
-                "ftp_path_NWLR_443": self.ftp_path_443,
-                "ftp_path_NWLR_490": self.ftp_path_490,
-                "ftp_path_NWLR_530": self.ftp_path_530,
-                "ftp_path_NWLR_565": self.ftp_path_565,
-                "ftp_path_NWLR_670": self.ftp_path_670,
-                "ftp_path_CDOM": self.ftp_path_CDOM,
-                "ftp_path_CHLA": self.ftp_path_CHLA,
-                "ftp_path_TSM": self.ftp_path_TSM,
-                "ftp_path_SST": self.ftp_path_SST,
-            }], columns=OUTPUT_COLUMNS)
+            j = pd.DataFrame([record], columns=OUTPUT_COLUMNS)
             df = pd.concat([df, j], axis=0, ignore_index=True)
         else:
             index = df.index[index]
-            df.loc[index, "ftp_path_NWLR_380"] = self.ftp_path_380
-            df.loc[index, "ftp_path_NWLR_412"] = self.ftp_path_412
-            df.loc[index, "ftp_path_NWLR_443"] = self.ftp_path_443
-            df.loc[index, "ftp_path_NWLR_490"] = self.ftp_path_490
-            df.loc[index, "ftp_path_NWLR_530"] = self.ftp_path_530
-            df.loc[index, "ftp_path_NWLR_565"] = self.ftp_path_565
-            df.loc[index, "ftp_path_NWLR_670"] = self.ftp_path_670
-            df.loc[index, "ftp_path_CDOM"] = self.ftp_path_CDOM
-            df.loc[index, "ftp_path_CHLA"] = self.ftp_path_CHLA
-            df.loc[index, "ftp_path_TSM"] = self.ftp_path_TSM
-            df.loc[index, "ftp_path_SST"] = self.ftp_path_SST
+            df.loc[index, list(record.keys())] = list(record.values())
         return df
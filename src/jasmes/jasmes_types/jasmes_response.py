@@ -51,6 +51,17 @@ class JASMESResponse:
             sep="\n"
         )
 
+    def to_record(self) -> dict:
+        """
+        returns the output columns of the response as a dict
+        """
+        return {
+            "file_name"    : self.fileName,
+            "ftp_path"   : self.filePath,
+            "file_size"    : self.fileSize,
+            "box_id"   : self.boxId,
+        }
+
     def to_dataframe(self, df:pd.DataFrame=None, index:int=None):
         """
         appends the response to a dataframe in index
@@ -62,18 +73,11 @@ class JASMESResponse:
             for c in OUTPUT_COLUMNS:
                 if c not in df.columns:
                     df[c] = []
+        record = self.to_record()
         if(index == df.size):
-            j = pd.DataFrame([{
-                "file_name"    : self.fileName,
-                "ftp_path"   : self.filePath,
-                "file_size"    : self.fileSize,
-                "box_id"   : self.boxId,
-            }], columns=OUTPUT_COLUMNS)
+            j = pd.DataFrame([record], columns=OUTPUT_COLUMNS)
             df = pd.concat([df, j], axis=0, ignore_index=True)
         else:
             index = df.index[index]
-            df.loc[index, "file_name"] = self.fileName
-            df.loc[index, "ftp_path"]=self.filePath
-            df.loc[index, "file_size"]=self.fileSize
-            df.loc[index, "box_id"]=self.boxId
+            df.loc[index, list(record.keys())] = list(record.values())
         return df
@@ -0,0 +1,110 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.utils import ColumnBuffer
+from src.tables import save_table
+
+def to_json(value):
+    """converts the numpy values of the results to json"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """hash of the input columns (date, lat, lon) of the rows, identifies the csv a journal belongs to"""
+    columns = [c for c in ("date", "lat", "lon") if c in df.columns]
+    hashes = pd.util.hash_pandas_object(df[columns], index=True).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+class Journal(ColumnBuffer):
+    def __init__(self, csv: Path, operation: str, df: pd.DataFrame):
+        """
+        append-only journal of the rows completed by an operation on the csv file,
+        written to {csv}.{operation}.journal.jsonl instead of rewriting the csv.
+        The results are written to the csv once at the end (commit).
+        If the journal of an interrupted run exists, its results are replayed into df
+        and its rows are listed in done to be skipped, the rows added later are listed in done too.
+        A journal written for other rows (see fingerprint) is discarded.
+
+        | csv: Path of the csv (or parquet, feather) file
+        | operation: name of the operation (search, extract)
+        | df: the dataframe read from the csv
+        """
+        super().__init__()
+        self.csv = csv
+        self.path = Path(f"{csv}.{operation}.journal.jsonl")
+        self.done = set()
+        if self.path.exists():
+            self.__replay(df)
+        new = not self.path.exists()
+        self.__file = open(self.path, "a")
+        if new: self.__write({"rows": len(df), "fingerprint": fingerprint(df)})
+
+    def add(self, index, columns: dict):
+        """
+        records the results of the rows in the journal
+
+        | index  : the index of the rows in the dataframe
+        | columns: dict column -> a value shared by all the rows or an array with one value per row
+        """
+        self.__write({"index": [int(i) for i in index], "columns": columns})
+        super().add(index, columns)
+        self.done.update(int(i) for i in index)
+
+    def commit(self, df: pd.DataFrame):
+        """
+        writes the results to the dataframe, saves it to the csv then deletes the journal
+        """
+        self.flush(df)
+        save_table(df, self.csv)
+        self.remove()
+
+    def remove(self):
+        """closes and deletes the journal (the results must be saved)"""
+        self.__file.close()
+        os.remove(self.path)
+
+    def __write(self, entry: dict):
+        self.__file.write(json.dumps(entry, default=to_json) + "\n")
+        self.__file.flush()
+
+    def __replay(self, df: pd.DataFrame):
+        valid = 0 # size of the complete entries, a partly written last entry is dropped
+        with open(self.path, "rb") as f:
+            lines = f.readlines()
+        try:
+            header = json.loads(lines[0])
+        except:
+            header = None
+        if header is None or header.get("rows") != len(df) or header.get("fingerprint") != fingerprint(df):
+            print(f"{self.path} doesn't match the csv, ignored")
+            os.remove(self.path)
+            return
+        valid += len(lines[0])
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"): break
+            super().add(entry["index"], entry["columns"])
+            self.done.update(entry["index"])
+            valid += len(line)
+        os.truncate(self.path, valid)
+        self.flush(df)
+        print(f"resuming from {self.path}: {len(self.done)} rows done")
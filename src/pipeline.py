@@ -0,0 +1,208 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+
+from argparse import Namespace
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+import pandas as pd
+from tqdm import tqdm
+from src.api_types import SGLIAPIs
+from src.args import TEMP_FOLDER
+from src.journal import Journal
+from src.tables import read_table, save_table
+from src.gportal import GportalApi, GPortalLvlProd
+from src.jasmes import JasmesCollector
+from src.search import group_rows, iter_search, add_result, open_search_cache, SEARCH_FAILED
+from src.extract import select_extractor, extract_group
+
+def pipeline(args: Namespace):
+    """
+    Streaming search -> download -> extract operation using csv file
+    The three stages run at the same time connected by bounded queues, a product is extracted
+    as soon as its download finishes. If download_dir is not provided (temp directory)
+    the product is deleted right after the extraction so the disk usage stays bounded.
+    arguments provided through json file or cmdline arguments:
+        - the arguments of search, download and extract
+        - pipeline_queue: number of products waiting between two stages, default: 2
+        - parallel_downloads: number of products downloaded at the same time (GPORTAL), default: 1
+    CSV file columns:
+        - date
+        - lat
+        - lon
+    Output columns are the search output columns and the extract output columns.
+    """
+    if args.api == SGLIAPIs.GPORTAL:
+        pl = GPortalLvlProd(args.product)
+        search_api = GportalApi(pl, max_workers=args.search_workers, search_cache=open_search_cache(args))
+        max_bandwidth = args.max_bandwidth * 1024 * 1024 if args.max_bandwidth else None
+        download_api = GportalApi(pl, max_workers=args.download_workers, max_bandwidth=max_bandwidth)
+        id_key = "identifier"
+        product_key = "download_url"
+    elif args.api == SGLIAPIs.JASMES:
+        # each stage talks to the ftp server through its own connection
+        search_api = JasmesCollector(host=args.jasmes_host, listing_ttl=args.listing_ttl)
+        search_api.set_auth_details(args.cred)
+        download_api = JasmesCollector(host=args.jasmes_host, max_connections=args.jasmes_connections)
+        id_key = "file_name"
+        product_key = "ftp_path_NWLR_380"
+    download_api.set_auth_details(args.cred)
+
+    # the products are extracted from the download directory
+    args = Namespace(**vars(args))
+    args.product_dir = args.download_dir
+    group_key, Extractor = select_extractor(args)
+    keep_products = Path(args.download_dir).resolve() != TEMP_FOLDER.resolve()
+
+    print("=============================")
+    print("Searching, downloading and extracting ...")
+    print("=============================")
+
+    df = read_table(args.csv) # read csv
+    # the completed rows of each stage are appended to its journal, an interrupted run is resumed:
+    # the searched rows are not searched again and the extracted rows are not downloaded again
+    search_journal = Journal(args.csv, "search", df)
+    extract_journal = Journal(args.csv, "extract", df)
+    lock = threading.Lock() # guards df, written by the search and the extract stages
+    downloads = queue.Queue(maxsize=args.pipeline_queue)
+    extracts = queue.Queue(maxsize=args.pipeline_queue)
+    pbar = tqdm(total=len(df), initial=len(extract_journal.done), position=0, leave=True) # extracted rows
+
+    errors = [] # the exceptions of the search and download stages, raised by the main thread
+
+    def search_stage():
+        try:
+            todo = df[~df.index.isin(search_journal.done)]
+            # the rows without date or location are never searched
+            pbar.update(int(todo[["date", "lat", "lon"]].isna().any(axis=1).sum()))
+            # the rows are searched date by date: once the date changes
+            # all the rows of the products of the previous date are known
+            groups = group_rows(args, todo)
+            # the rows searched but not extracted by an interrupted run go first
+            current_date, rows = None, sorted(search_journal.done - extract_journal.done)
+
+            def emit():
+                # the results of the date are written to the df at once
+                # then its products are handed to the download stage
+                with lock:
+                    search_journal.flush(df)
+                    keys = df.loc[rows, product_key] if product_key in df.columns else pd.Series(index=rows, dtype=object)
+                products = {}
+                for index, key in keys.items():
+                    if isinstance(key, str):
+                        products.setdefault(key, []).append(index)
+                # the rows without product are done
+                pbar.update(len(keys) - sum(len(r) for r in products.values()))
+                for item in products.items(): downloads.put(item)
+
+            for g, skip, result in iter_search(args, search_api, groups, id_key):
+                date = g.iloc[0]["date"]
+                if date != current_date:
+                    emit()
+                    current_date, rows = date, []
+                if result is SEARCH_FAILED:
+                    # not journaled, searched again by the next run
+                    pbar.update(len(g))
+                    continue
+                add_result(search_journal, g, skip, result, args.api)
+                rows.extend(g.index)
+            emit()
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            downloads.put(None)
+
+    def download_worker():
+        try:
+            while (item := downloads.get()) is not None:
+                key, rows = item
+                try:
+                    if args.api == SGLIAPIs.GPORTAL:
+                        path = download_api.download(key, args.download_dir)
+                        if path is None:
+                            # failed, the error is printed by download
+                            pbar.update(len(rows))
+                            continue
+                        files = [path]
+                    else:
+                        with lock:
+                            row = df.loc[rows[0]].to_dict()
+                        paths = {k: row[k] for k in row.keys() if k.startswith("ftp_path")}
+                        files = list(json.loads(download_api.download(paths, args.download_dir)).values())
+                except Exception as e:
+                    print(e)
+                    pbar.update(len(rows))
+                    continue
+                extracts.put((rows, files))
+            # wakes up the next worker
+            downloads.put(None)
+        except BaseException as e:
+            errors.append(e)
+
+    def download_stage():
+        # parallel_downloads products are downloaded at the same time (GPORTAL),
+        # their chunks share the thread pool of the download api
+        workers = [
+            threading.Thread(target=download_worker, daemon=True)
+            for _ in range(args.parallel_downloads if args.api == SGLIAPIs.GPORTAL else 1)
+        ]
+        try:
+            for w in workers: w.start()
+            for w in workers: w.join()
+        finally:
+            extracts.put(None)
+
+    stages = [
+        threading.Thread(target=search_stage, daemon=True),
+        threading.Thread(target=download_stage, daemon=True),
+    ]
+    for t in stages: t.start()
+
+    # extract stage
+    i = 0
+    while (item := extracts.get()) is not None:
+        rows, files = item
+        with lock:
+            group = df.loc[rows]
+        id = group.iloc[0][group_key]
+        pixels = None
+        if isinstance(id, str) and len(id) >= 41 and not group[["lat", "lon"]].isna().any(axis=None):
+            pixels = extract_group(args, Extractor, id, group)
+        # add the pixels to the journal (failed products are retried by the next run)
+        if pixels is not None:
+            extract_journal.add(group.index, pixels)
+        if not keep_products:
+            for f in files:
+                if os.path.exists(f): os.remove(f)
+        pbar.set_description(f"{i+1}:{id.split('/')[-1] if isinstance(id, str) else id}")
+        pbar.update(len(rows))
+        i += 1
+
+    pbar.close()
+    if errors:
+        # the journals are kept, the next run resumes from them
+        raise errors[0]
+    for t in stages: t.join()
+    if args.api == SGLIAPIs.GPORTAL:
+        search_api.close()
+        download_api.close()
+
+    search_journal.flush(df)
+    extract_journal.flush(df)
+    # clean columns
+    for c in df.columns:
+        if c.startswith("Unnamed"):
+            df.drop(columns=c, inplace=True)
+    save_table(df, args.csv) # save to csv
+    search_journal.remove()
+    extract_journal.remove()
@@ -10,39 +10,218 @@
 
 
 from argparse import Namespace
+import itertools
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import time
 from src import download
 from src.api_types import SGLIAPIs
-from src.gportal import GportalApi, GPortalLvlProd, GPortalResolution
-from src.jasmes import JasmesCollector
-
-"""
-Utility function to get the value from a dict and validate it
-"""
-def get_value(d: dict, key: str):
-    """
-    Utility function to get the value from a dict and validate it
-    """
-    if key in d and d[key]:
-        return d[key]
-    
-def fill_group(df, g, api):
-    
-    for j in range(len(g)):
-        if api ==SGLIAPIs.GPORTAL:
-            df.loc[df.index[g.index[j]], "identifier"] = g.iloc[0]["identifier"]
-            df.loc[df.index[g.index[j]], "file_status"] = g.iloc[0]["file_status"]
-            df.loc[df.index[g.index[j]], "resolution"] = g.iloc[0]["resolution"]
-            df.loc[df.index[g.index[j]], "download_url"] = g.iloc[0]["download_url"]
-            df.loc[df.index[g.index[j]], "preview_url"] = g.iloc[0]["preview_url"]
-            df.loc[df.index[g.index[j]], "cloud_coverage"] = g.iloc[0]["cloud_coverage"]
-        elif api == SGLIAPIs.JASMES:
-            df.loc[df.index[g.index[j]], "file_name"] = g.iloc[0]["file_name"]
-            df.loc[df.index[g.index[j]], "file_size"] = g.iloc[0]["file_size"]
-            df.loc[df.index[g.index[j]], "ftp_path"] = g.iloc[0]["ftp_path"]
-            df.loc[df.index[g.index[j]], "box_id"] = g.iloc[0]["box_id"]
+from src.gportal import GportalApi, GPortalLvlProd, GPortalResolution, GPortalSearchCache, GPortalFootprintIndex
+from src.jasmes import JasmesCollector, find_boxes
+from src.args import CACHE_FOLDER
+from src.utils import TokenBucket, ColumnBuffer, backoff_delay, ordered_map, best_polygons
+from src.journal import Journal
+from src.tables import read_table
+from concurrent.futures import ThreadPoolExecutor
+
+# attempts of a search request before its rows are reported as failed
+SEARCH_RETRIES = 5
+# result of the groups whose search failed, their rows are not journaled and are searched again by the next run
+SEARCH_FAILED = object()
+
+FILL_COLUMNS = {
+    SGLIAPIs.GPORTAL: ["identifier", "file_status", "resolution", "download_url", "preview_url", "cloud_coverage"],
+    SGLIAPIs.JASMES: ["file_name", "file_size", "ftp_path", "box_id"],
+}
+
+def fill_group(g, api):
+    """
+    returns the search output columns of the first row of the group, to be copied to all the rows of the group
+    """
+    row = g.iloc[0]
+    return {c: row[c] for c in FILL_COLUMNS[api] if c in g.columns}
+
+def with_retry(request, limiter: TokenBucket = None):
+    """
+    sends a request and retries with exponential backoff (and jitter) until it succeeds,
+    the error of the last attempt is raised after SEARCH_RETRIES attempts
+
+    | request: function sending the request
+    | limiter: TokenBucket shared rate limiter of the search requests, None for no limit
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return request()
+        except Exception as e:
+            print(e)
+            attempt += 1
+            if attempt >= SEARCH_RETRIES: raise
+            time.sleep(backoff_delay(attempt))
+
+def search_with_retry(api, date: str, lat: float, lon: float, resolution: GPortalResolution, limiter: TokenBucket = None):
+    """
+    sends a search request and retries with exponential backoff (and jitter) until it succeeds,
+    raises after SEARCH_RETRIES attempts
+
+    | limiter: TokenBucket shared rate limiter of the search requests, None for no limit
+    """
+    # send search request 
+    return with_retry(lambda: api.search(date, lat, lon, resolution, verbose=False), limiter)
+
+def open_search_cache(args: Namespace) -> GPortalSearchCache:
+    """
+    opens the on-disk cache of the GPortal search responses if search_cache is set
+    """
+    if not args.search_cache:
+        return None
+    return GPortalSearchCache(CACHE_FOLDER / "gportal_search.sqlite", args.search_cache_expiry * 3600)
+
+def search_cell(args: Namespace, lat: float, lon: float):
+    """
+    the cell of the search planner of a point, the points of a date in the same cell
+    are searched by one GPortal query (search_cluster degrees, 0 for one query per point)
+    """
+    if args.api != SGLIAPIs.GPORTAL or not args.search_cluster:
+        return lat, lon
+    return np.floor(lat / args.search_cluster), np.floor(lon / args.search_cluster)
+
+def group_rows(args: Namespace, df: pd.DataFrame):
+    """
+    groups the rows sharing the same search, date by date: by (lat, lon) for GPORTAL
+    and by box for JASMES (the products of a box cover all its points).
+    The boxes of all the rows are found at once.
+    For GPORTAL, the points of the same cell of the search planner follow each other.
+    yields ((lat, lon, date), group) with the lat, lon of the first row of the group
+    """
+    if args.api == SGLIAPIs.JASMES:
+        boxes = pd.Series(find_boxes(df["lat"], df["lon"]), index=df.index, name="box")
+        for (date, _), g in df.groupby(["date", boxes]):
+            yield (g.iloc[0]["lat"], g.iloc[0]["lon"], date), g
+    elif args.search_cluster:
+        cell_lat, cell_lon = search_cell(args, df["lat"].rename("cell_lat"), df["lon"].rename("cell_lon"))
+        for (date, _, _, lat, lon), g in df.groupby(["date", cell_lat, cell_lon, "lat", "lon"]):
+            yield (lat, lon, date), g
+    else:
+        for (date, lat, lon), g in df.groupby(["date", "lat", "lon"]):
+            yield (lat, lon, date), g
+
+def iter_search(args: Namespace, api, groups, id_key: str):
+    """
+    searches the groups of rows sharing the same search, concurrently for GPORTAL (search_workers).
+    For GPORTAL, the groups of a date in the same cell of the search planner are searched by one query
+    over their area, then each point is resolved locally against the returned footprints.
+    yields (group, skip, result) in the order of the groups, skip is set if the group already has an
+    identifier and no_repeat is set (it is not searched), result is SEARCH_FAILED if the search failed
+
+    | groups: iterable of ((lat, lon, date), group), see group_rows
+    | id_key: the column identifying the product of a row
+    """
+    resolution = GPortalResolution.H
+    # the JASMES api talks through a single ftp connection, only GPortal is searched concurrently
+    workers = args.search_workers if args.api == SGLIAPIs.GPORTAL else 1
+    limiter = TokenBucket(args.rate_limit, burst=workers) if args.rate_limit else None
+
+    def search_cluster(cluster):
+        try:
+            return resolve_cluster(cluster)
+        except Exception:
+            # failed SEARCH_RETRIES times, the error is printed by with_retry
+            return [SEARCH_FAILED] * len(cluster)
+
+    def resolve_cluster(cluster):
+        points = [(lat, lon) for (lat, lon, _), _, skip in cluster if not skip]
+        if len(points) == 0:
+            return [None] * len(cluster)
+        date = cluster[0][0][2]
+        if len(points) == 1:
+            lat, lon = points[0]
+            result = search_with_retry(api, date, lat, lon, resolution, limiter)
+            return [None if skip else result for _, _, skip in cluster]
+        # one query over the area of the points
+        lats, lons = np.array(points).T
+        area = with_retry(lambda: api.search_area(date, lats.min(), lons.min(), lats.max(), lons.max(), resolution, verbose=False), limiter)
+        if area is None:
+            return [None] * len(cluster)
+        # all the points of the cluster are resolved against the footprints at once
+        found = iter(area.filter_many(lats, lons))
+        return [None if skip else next(found) for _, _, skip in cluster]
+
+    def tasks():
+        for key, g in groups:
+            id = g[id_key].iat[0] if id_key in g.columns else None
+            # skip the search if no repeat and id exists
+            yield key, g, bool(args.no_repeat and not pd.isna(id) and id)
+
+    def clusters():
+        # consecutive groups of the same date and cell
+        key = lambda task: (task[0][2], search_cell(args, task[0][0], task[0][1]))
+        for _, cluster in itertools.groupby(tasks(), key=key):
+            yield list(cluster)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for cluster, results in ordered_map(executor, search_cluster, clusters(), 4 * workers):
+            for (_, g, skip), result in zip(cluster, results):
+                yield g, skip, result
+
+def join_index(args: Namespace, index: GPortalFootprintIndex, dataset: str, df: pd.DataFrame, buffer: ColumnBuffer, pbar: tqdm):
+    """
+    matches the rows against the footprint index filled by harvest instead of searching GPortal.
+    The rows are matched date by date: the footprints of the date overlapping the rows are loaded
+    from the index then all the rows are resolved at once with the same rule as filter_results
+    (the product containing the point with the point closest to its center).
+    The rows without a product are added without columns.
+
+    | index: the footprint index
+    | dataset: string GPortal dataset id
+    | df: the rows to match
+    | buffer: the buffer the results are added to
+    | pbar: progress bar of the rows
+    """
+    resolution = GPortalResolution.H.value
+    def index_date(date):
+        # the dates are written YYYY/MM/DD in the index
+        t = pd.to_datetime(date, errors="coerce")
+        return None if pd.isna(t) else t.strftime("%Y/%m/%d")
+
+    # each distinct date is parsed once
+    dates = df["date"].map({d: index_date(d) for d in df["date"].dropna().unique()})
+    missing = ~dates.isin(index.dates(dataset, resolution))
+    if missing.any():
+        print(f"> {missing.sum()} rows on dates not harvested in {args.footprint_index}")
+    for date, g in df.groupby(dates, dropna=False):
+        # skip the search if no repeat and id exists
+        ids = g["identifier"] if "identifier" in g.columns else pd.Series(None, index=g.index, dtype=object)
+        skip = (args.no_repeat & ids.notna() & (ids.astype(str) != "")).to_numpy()
+        buffer.add(g.index[skip], {})
+        g = g[~skip]
+        lats, lons = g["lat"].to_numpy(float), g["lon"].to_numpy(float)
+        if len(g) and isinstance(date, str) and not np.isnan(lats).all() and not np.isnan(lons).all():
+            records, edges = index.footprints(dataset, resolution, date, (np.nanmin(lats), np.nanmin(lons), np.nanmax(lats), np.nanmax(lons)))
+            best = best_polygons(edges, lons, lats)
+        else:
+            records, best = None, np.full(len(g), -1)
+        found = best >= 0
+        if found.any():
+            buffer.add(g.index[found], {c: records[c].to_numpy()[best[found]] for c in records.columns})
+        buffer.add(g.index[~found], {})
+        pbar.update(len(skip))
+
+def add_result(buffer: ColumnBuffer, g: pd.DataFrame, skip: bool, result, api: SGLIAPIs):
+    """
+    adds the search result of a group to the rows of the group in the buffer
+    (the rows without result are added without columns)
+    """
+    if skip:
+        buffer.add(g.index, fill_group(g, api))
+    # if results returned add to the data
+    elif result != None:
+        buffer.add(g.index, result.to_record())
+    else:
+        buffer.add(g.index, {})
 
 def search(args: Namespace):
     """
@@ -52,6 +231,16 @@ def search(args: Namespace):
         - product: GPortal Products or Jasmes Products
         - csv: path to csv file
         - no_repeat: boolean, if identifier exists will not search the corresponding row
+        - search_workers: int, number of search requests in flight at once (GPORTAL only), default: 1
+        - rate_limit: float, maximum search requests per second, default: no limit
+        - search_cluster: float, size in degrees of the cells grouping the points of a date
+                          searched by one GPortal query, 0 for one query per point, default: 1
+        - search_cache: boolean, cache the GPortal search responses on disk
+        - search_cache_expiry: float, number of hours the cached search responses are valid, default: 168
+        - jasmes_host: host name of the JASMES ftp server (JASMES), default: apollo.eorc.jaxa.jp
+        - listing_ttl: float, number of hours the JASMES directory listings are cached, default: 24
+        - footprint_index: path of the footprint index filled by harvest (GPORTAL), the rows are matched
+                           against the index instead of searching GPortal
     CSV file columns:
         - date
         - lat
@@ -73,10 +262,10 @@ def search(args: Namespace):
     """
     if args.api == SGLIAPIs.GPORTAL:
         pl = GPortalLvlProd(args.product)
-        api = GportalApi(pl)
+        api = GportalApi(pl, max_workers=args.search_workers, search_cache=open_search_cache(args))
         id_key = "identifier"
     elif args.api == SGLIAPIs.JASMES:
-        api = JasmesCollector()
+        api = JasmesCollector(host=args.jasmes_host, listing_ttl=args.listing_ttl)
         api.set_auth_details(args.cred)
         id_key = "file_name"
 
@@ -84,46 +273,34 @@ def search(args: Namespace):
     print("Searching CSV ...")
     print("=============================")
 
-    df = pd.read_csv(args.csv, low_memory=True) # read csv
-    grouped = df.groupby(["lat", "lon", "date"])
-    pbar = tqdm(total=len(df), position=0, leave=True) # prepare progress bar
-
-    for i, ((lat, lon, date), g) in enumerate(grouped):
-    
-        id = get_value(g.iloc[0].fillna(0).to_dict(), id_key)
-        resolution = GPortalResolution.H
-
-        # progress if no repeat and id exists
-        if id and args.no_repeat: 
-            fill_group(df, g, args.api)
-            pbar.update(len(g))
-            continue
-
-        search_error = False
-        while True:
-            if search_error:
-                time.sleep(10)
-            try:
-                # send search request 
-                result = api.search(date, lat, lon, resolution, verbose=False)
-                search_error = False
-            except Exception as e:
-                print(e)
-                search_error = True
-            if not search_error: break
-
-        # if results returned add to the data
-        if result != None:
-            for j in range(len(g)):
-                result.to_dataframe(df, g.index[j])
-
-        pbar.update(len(g)) # update progress bar
-
-        # save to csv every 100 row
-        if (i % 100 == 0): df.to_csv(args.csv, index=False)
-
-    df.to_csv(args.csv, index=False) # save to csv
+    df = read_table(args.csv) # read csv
+    # the completed rows are appended to the journal, the rows done by an interrupted run are skipped
+    journal = Journal(args.csv, "search", df)
+    grouped = group_rows(args, df[~df.index.isin(journal.done)])
+    pbar = tqdm(total=len(df), initial=len(journal.done), position=0, leave=True) # prepare progress bar
+
+    if args.api == SGLIAPIs.GPORTAL and args.footprint_index:
+        # the rows are matched against the harvested footprints, GPortal is not searched
+        index = GPortalFootprintIndex(args.footprint_index)
+        join_index(args, index, api.dataset, df[~df.index.isin(journal.done)], journal, pbar)
+        index.close()
+    else:
+        # results are written back in the order of the groups
+        failed = 0
+        for g, skip, result in iter_search(args, api, grouped, id_key):
+            if result is SEARCH_FAILED:
+                failed += len(g)
+            else:
+                add_result(journal, g, skip, result, args.api)
+
+            pbar.update(len(g)) # update progress bar
+        if failed:
+            print(f"> the search of {failed} rows failed, run again to search them")
+
+    journal.commit(df) # save to csv
     pbar.close()
+    if args.api == SGLIAPIs.GPORTAL:
+        api.close()
 
     # move to download option if download is set
     if args.download:
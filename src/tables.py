@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import os
+from pathlib import Path
+import pandas as pd
+
+# the format of a table file is chosen by its extension, anything else is read and written as csv
+PARQUET_SUFFIXES = (".parquet", ".pq")
+FEATHER_SUFFIXES = (".feather", ".arrow", ".ipc")
+
+def table_format(path: Path) -> str:
+    """
+    returns the format of the table file: parquet, feather or csv
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    if suffix in FEATHER_SUFFIXES:
+        return "feather"
+    return "csv"
+
+def table_columns(path: Path) -> list[str]:
+    """
+    returns the column names of the table file without reading its rows
+    """
+    format = table_format(path)
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if format == "feather":
+        import pyarrow.ipc as ipc
+        with ipc.open_file(path) as reader:
+            return reader.schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def read_table(path: Path, columns: list[str]=None) -> pd.DataFrame:
+    """
+    reads the table file (csv, parquet or feather)
+
+    | path: Path of the file
+    | columns: list of the columns to read, the columns missing from the file are ignored, None to read all the columns
+    """
+    if columns is not None:
+        available = table_columns(path)
+        columns = [c for c in available if c in columns]
+    format = table_format(path)
+    if format == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if format == "feather":
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, low_memory=True)
+
+def save_table(df: pd.DataFrame, path: Path):
+    """
+    saves the dataframe to the table file (csv, parquet or feather) through a temporary file,
+    an interrupted save leaves the previous file untouched
+    """
+    tmp = f"{path}.tmp"
+    format = table_format(path)
+    if format == "parquet":
+        df.to_parquet(tmp, index=False)
+    elif format == "feather":
+        df.reset_index(drop=True).to_feather(tmp)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
@@ -9,15 +9,23 @@
 #
 
 import os, shutil
-from src.args import TEMP_FOLDER
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+import numpy as np
+import pandas as pd
+from src.args import TEMP_FOLDER, CACHE_FOLDER
 
 def empty_temp():
     """
-    Clear the temporary files from ./temp
+    Clear the temporary files from ./temp (the persistent cache folder is kept)
     """
     for filename in os.listdir(TEMP_FOLDER):
         if filename.endswith("tmp"): continue
         file_path = os.path.join(TEMP_FOLDER, filename)
+        if os.path.samefile(file_path, CACHE_FOLDER): continue
         try:
             if os.path.isfile(file_path) or os.path.islink(file_path):
                 os.unlink(file_path)
@@ -54,7 +62,7 @@ def inside_polygon(px: list[float], py: list[float], x: float, y: float)->bool:
         p1y = p2y
         i += 1
 
-    if (counter % 2 == 0):
+    if (counter % 2 == 1):
         return True
     else:
         return False
@@ -66,3 +74,231 @@ def distance(coord1, coord2):
 def min_distance(point, polygon):
     return min(distance(point, coord) for coord in polygon)
 
+def polygon_edges(polygons: list[list[list[float]]]) -> np.ndarray:
+    """
+    packs the edges of the polygons in one array for inside_polygons and border_distances
+
+    | polygons: list of polygons, each a closed list of (x, y) vertices (the last vertex repeats the first)
+
+    returns float array (polygons, edges, 4) of the edges (x1, y1, x2, y2),
+    the polygons with less vertices are padded with NaN edges
+    """
+    n = max((len(p) for p in polygons), default=1)
+    edges = np.full((len(polygons), max(n - 1, 1), 4), np.nan)
+    for i, p in enumerate(polygons):
+        p = np.asarray(p, dtype=float).reshape(-1, 2)
+        edges[i, :len(p) - 1, :2] = p[:-1]
+        edges[i, :len(p) - 1, 2:] = p[1:]
+    return edges
+
+def inside_polygons(edges: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    tests points against polygons at once (same ray casting rule as inside_polygon)
+
+    | edges: float array (..., edges, 4) of the polygons, see polygon_edges
+    | x    : float array of the x's to check, broadcast against the polygons (edges.shape[:-2])
+    | y    : float array of the y's to check
+
+    returns bool array of the broadcast shape
+    """
+    x1, y1, x2, y2 = (edges[..., k] for k in range(4))
+    x = np.asarray(x, dtype=float)[..., None]
+    y = np.asarray(y, dtype=float)[..., None]
+    # the comparisons with the NaN padding are false, the padded edges never cross
+    cross = (y > np.fmin(y1, y2)) & (y <= np.fmax(y1, y2)) & (x <= np.fmax(x1, x2)) & (y1 != y2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xinters = (y - y1) * (x2 - x1) / (y2 - y1) + x1
+    cross &= (x1 == x2) | (x <= xinters)
+    return cross.sum(axis=-1) % 2 == 1
+
+def border_distances(edges: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    distance from points to the border (closest edge) of polygons
+
+    | edges: float array (..., edges, 4) of the polygons, see polygon_edges
+    | x    : float array of the x's, broadcast against the polygons (edges.shape[:-2])
+    | y    : float array of the y's
+
+    returns float array of the broadcast shape
+    """
+    x1, y1, x2, y2 = (edges[..., k] for k in range(4))
+    x = np.asarray(x, dtype=float)[..., None]
+    y = np.asarray(y, dtype=float)[..., None]
+    ex, ey = x2 - x1, y2 - y1
+    length = ex * ex + ey * ey
+    # projection of the point on the edge, clipped to the edge ends
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip(((x - x1) * ex + (y - y1) * ey) / length, 0, 1)
+    t = np.where(length > 0, t, 0)
+    d = np.hypot(x - x1 - t * ex, y - y1 - t * ey)
+    return np.where(np.isnan(d), np.inf, d).min(axis=-1)
+
+def grid_pairs(boxes: np.ndarray, x: np.ndarray, y: np.ndarray, cell: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    finds the (point, polygon) pairs where the point is inside the bounding box of the polygon
+    using a grid: each polygon is listed in the cells its bounding box covers
+    and each point is looked up in its cell
+
+    | boxes: float array (polygons, 4) of the bounding boxes (min_x, min_y, max_x, max_y)
+    | x    : float array (points) of the x's
+    | y    : float array (points) of the y's
+    | cell : float size of the grid cells
+
+    returns int arrays (pairs) of the point index and the polygon index of each pair
+    """
+    def cells(v):
+        # the cells of the NaN points or boxes are out of the grid
+        return np.floor(np.nan_to_num(v / cell, nan=-1 << 40)).astype(np.int64)
+
+    x0, y0, x1, y1 = (cells(boxes[:, k]) for k in range(4))
+    nx, ny = x1 - x0 + 1, y1 - y0 + 1
+    n = np.where((nx > 0) & (ny > 0), nx * ny, 0)
+    polygon = np.repeat(np.arange(len(boxes)), n)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) # index of the cell in the bounding box
+    keys = (x0[polygon] + k % nx[polygon]) * (1 << 32) + (y0[polygon] + k // nx[polygon])
+    order = np.argsort(keys, kind="stable")
+    keys, polygon = keys[order], polygon[order]
+
+    point_keys = cells(x) * (1 << 32) + cells(y)
+    lo = np.searchsorted(keys, point_keys, "left")
+    count = np.searchsorted(keys, point_keys, "right") - lo
+    p = np.repeat(np.arange(len(x)), count)
+    f = polygon[np.repeat(lo, count) + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)]
+    keep = (x[p] >= boxes[f, 0]) & (y[p] >= boxes[f, 1]) & (x[p] <= boxes[f, 2]) & (y[p] <= boxes[f, 3])
+    return p[keep], f[keep]
+
+def best_polygons(edges: np.ndarray, x: np.ndarray, y: np.ndarray, chunk: int=1 << 18) -> np.ndarray:
+    """
+    selects for each point the polygon containing it with the point closest to its center
+    (the farthest from its border), ties go to the first polygon.
+    Only the polygons whose bounding box contains the point are tested, found with a grid (see grid_pairs)
+
+    | edges: float array (polygons, edges, 4), see polygon_edges
+    | x    : float array (points) of the x's
+    | y    : float array (points) of the y's
+    | chunk: maximum number of points matched at once, bounds the memory
+
+    returns int array (points) of the polygon index of each point, -1 if no polygon contains the point
+    """
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    y = np.atleast_1d(np.asarray(y, dtype=float))
+    best = np.full(len(x), -1)
+    if edges.shape[0] == 0: return best
+    boxes = np.stack([
+        np.nanmin(edges[..., 0::2], axis=(1, 2)), np.nanmin(edges[..., 1::2], axis=(1, 2)),
+        np.nanmax(edges[..., 0::2], axis=(1, 2)), np.nanmax(edges[..., 1::2], axis=(1, 2)),
+    ], axis=1)
+    # cells of the size of a typical polygon: each polygon covers a few cells
+    size = np.fmax(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    cell = max(float(np.nanmedian(size)) if np.isfinite(size).any() else 1.0, 1e-3)
+    for i in range(0, len(x), chunk):
+        cx, cy = x[i:i + chunk], y[i:i + chunk]
+        p, f = grid_pairs(boxes, cx, cy, cell)
+        inside = inside_polygons(edges[f], cx[p], cy[p])
+        p, f = p[inside], f[inside]
+        if len(p) == 0: continue
+        score = border_distances(edges[f], cx[p], cy[p])
+        # the best pair of each point: sorted by point, then score (descending), then polygon
+        order = np.lexsort((f, -score, p))
+        points, first = np.unique(p[order], return_index=True)
+        best[i + points] = f[order][first]
+    return best
+
+
+class TokenBucket:
+    """
+    thread-safe token bucket rate limiter
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        | rate : float tokens added per second
+        | burst: int maximum number of tokens that can be taken at once
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.__tokens = float(self.burst)
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """
+        blocks until the tokens are available then takes them
+        """
+        tokens = min(tokens, self.burst)
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+                self.__last = now
+                if self.__tokens >= tokens:
+                    self.__tokens -= tokens
+                    return
+                wait = (tokens - self.__tokens) / self.rate
+            time.sleep(wait)
+
+def backoff_delay(attempt: int, base: float = 1, cap: float = 60) -> float:
+    """
+    exponential backoff with full jitter: a random delay between 0 and min(cap, base * 2^attempt) seconds
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def ordered_map(executor: Executor, fn, items, window: int):
+    """
+    runs fn over the items in the executor with at most `window` calls pending at once.
+    yields (item, result) in the order of the items
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+class ColumnBuffer:
+    """
+    collects the results of many rows column by column and writes them
+    to the dataframe with one assignment per column
+    """
+    def __init__(self):
+        self.__columns = {}
+
+    def add(self, index, columns: dict):
+        """
+        | index  : the index of the rows in the dataframe
+        | columns: dict column -> a value shared by all the rows or an array with one value per row
+        """
+        index = np.asarray(index)
+        for k, v in columns.items():
+            values = np.asarray(v, dtype=object if isinstance(v, str) or v is None else None)
+            if values.dtype.kind in "US":
+                # the strings are kept as objects, a numpy string column would turn the NaNs into "nan"
+                values = values.astype(object)
+            self.__columns.setdefault(k, []).append((index, np.broadcast_to(values, index.shape)))
+
+    def __len__(self):
+        return len(self.__columns)
+
+    def flush(self, df: pd.DataFrame):
+        """
+        writes the collected values to the dataframe (new columns are added) and empties the buffer
+        """
+        for k, parts in self.__columns.items():
+            index = np.concatenate([i for i, _ in parts])
+            values = np.concatenate([v for _, v in parts])
+            if k not in df.columns:
+                df[k] = pd.Series(values, index=index)
+                continue
+            # upcast the column once (ex: an empty float column receiving strings)
+            dtype = df[k].dtype
+            if isinstance(dtype, np.dtype) and dtype != object:
+                dtype = np.result_type(dtype, values.dtype)
+                if dtype.kind in "US": dtype = object
+            elif values.dtype != object:
+                dtype = object
+            if df[k].dtype != dtype:
+                df[k] = df[k].astype(dtype)
+            df.loc[index, k] = values
+        self.__columns = {}
@@ -0,0 +1,104 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sys
+from pathlib import Path
+
+# src.args parses the command line when imported, give it a valid one
+sys.argv = [sys.argv[0], "--search", "--csv", "tests.csv", "--cred", "cred.json", "-p", "L2R"]
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import json
+import threading
+import pytest
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    """
+    local ftp server (pyftpdlib) serving tmp_path/root to the account "u" with the password "p"
+
+    returns (host:port, root Path, credentials json Path)
+    """
+    pytest.importorskip("pyftpdlib")
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+    root = tmp_path / "root"
+    root.mkdir()
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("u", "p", str(root), perm="elr")
+    handler = type("Handler", (FTPHandler,), {"authorizer": authorizer})
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"timeout": 0.1}, daemon=True)
+    thread.start()
+    cred = tmp_path / "cred.json"
+    cred.write_text(json.dumps({"account": "u", "password": "p"}))
+    yield "127.0.0.1:%d" % server.address[1], root, cred
+    server.close_all()
+    thread.join(5)
+
+@pytest.fixture
+def http_server():
+    """
+    local http server of one file supporting the range requests
+
+    returns the server: server.url of the file, server.content (bytes) to serve,
+    server.faults the answers to give to the next GET requests ("503" or "short") or HEAD request ("drop"),
+    server.ranges the Range headers received, server.missing the paths answered 404
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            if server.faults and server.faults[0] == "drop":
+                # closes the connection without answering
+                server.faults.pop(0)
+                self.close_connection = True
+                return
+            if self.path in server.missing:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(server.content)))
+            self.end_headers()
+
+        def do_GET(self):
+            fault = server.faults.pop(0) if server.faults else None
+            if fault == "503":
+                body = b"<html>Service Unavailable</html>"
+                self.send_response(503)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            start, end = self.headers["Range"].split("=")[1].split("-")
+            server.ranges.append((int(start), int(end)))
+            body = server.content[int(start):int(end) + 1]
+            if fault == "short":
+                body = body[:len(body) // 2]
+            self.send_response(206)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.url = "http://127.0.0.1:%d/GC1SG1_TEST.h5" % server.server_address[1]
+    server.content = bytes(range(256)) * 40
+    server.faults = []
+    server.ranges = []
+    server.missing = set()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,35 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import numpy as np
+import pandas as pd
+from src.utils import ColumnBuffer
+
+def test_strings_into_nan_column():
+    df = pd.DataFrame({"identifier": [np.nan] * 3, "cloud_coverage": [np.nan] * 3})
+    buffer = ColumnBuffer()
+    # the lists replayed from a journal
+    buffer.add([0, 2], {"identifier": ["a", "c"], "cloud_coverage": [5, 7]})
+    buffer.flush(df)
+    assert df["identifier"].iloc[0] == "a" and df["identifier"].iloc[2] == "c"
+    assert pd.isna(df["identifier"].iloc[1])
+    assert df["cloud_coverage"].dtype == float
+    assert df["cloud_coverage"].tolist()[::2] == [5, 7]
+
+def test_new_columns():
+    df = pd.DataFrame({"lat": [1.0, 2.0, 3.0]})
+    buffer = ColumnBuffer()
+    buffer.add([1], {"identifier": np.array(["b"]), "value": 2.5})
+    buffer.add([2], {"identifier": None, "value": np.nan})
+    buffer.flush(df)
+    assert df["identifier"].iloc[1] == "b"
+    assert pd.isna(df["identifier"].iloc[0]) and pd.isna(df["identifier"].iloc[2])
+    assert df["value"].iloc[1] == 2.5
+    assert len(buffer) == 0
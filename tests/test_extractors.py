@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sys
+import h5py
+import numpy as np
+import pytest
+from src.extractors import GPortalL2RExtractor
+from src.extractors.utils import to_unit_xyz, read_pixels
+
+utils = sys.modules["src.extractors.utils"]
+
+BANDS = [380, 412, 443, 490, 530, 565, 670]
+LINES, PIXELS, INTERVAL = 200, 180, 10
+
+@pytest.fixture
+def l2r(tmp_path):
+    """small synthetic L2R product: a skewed tie-point grid around (32.5, 130.5) and random bands"""
+    path = tmp_path / "GC1SG1_202301010000A00000_2SFSQ_NWLRQ_3000.h5"
+    lines, pixels = LINES // INTERVAL + 1, PIXELS // INTERVAL + 1
+    lat = np.linspace(35, 30, lines)[:, None] + np.linspace(0, 0.5, pixels)[None, :]
+    lon = np.linspace(128, 133, pixels)[None, :] + np.linspace(0, 0.3, lines)[:, None]
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        for name, data in [("Latitude", lat), ("Longitude", lon)]:
+            ds = f.create_dataset("Geometry_data/" + name, data=data.astype(np.float32))
+            ds.attrs["Resampling_interval"] = np.array([INTERVAL], dtype=np.int32)
+        image = f.create_group("Image_data")
+        image.attrs["Number_of_pixels"] = np.array([PIXELS])
+        image.attrs["Number_of_lines"] = np.array([LINES])
+        for w in BANDS:
+            ds = image.create_dataset(f"NWLR_{w}", data=rng.integers(0, 65536, (LINES, PIXELS)).astype(np.uint16), chunks=(50, 60))
+            for k, v in dict(Error_DN=65535, Maximum_valid_DN=50000, Minimum_valid_DN=0, Rrs_slope=2e-6, Rrs_offset=-0.01).items():
+                ds.attrs[k] = np.array([v])
+        image.create_dataset("QA_flag", data=rng.integers(0, 65536, (LINES, PIXELS)).astype(np.uint16))
+    return path
+
+def points(n=40):
+    rng = np.random.default_rng(1)
+    return rng.uniform(30.5, 34.5, n), rng.uniform(128.5, 132.5, n)
+
+def reference(path, lats, lons):
+    """the full-array path: the whole geolocation grid interpolated with bilin_2d, the closest pixel by brute force"""
+    extractor = GPortalL2RExtractor(path)
+    with h5py.File(path, "r") as f:
+        lat = extractor.bilin_2d(f["Geometry_data/Latitude"][:], INTERVAL)[:LINES, :PIXELS]
+        lon = extractor.bilin_2d(f["Geometry_data/Longitude"][:], INTERVAL, True)[:LINES, :PIXELS]
+        grid = to_unit_xyz(lat.ravel(), lon.ravel())
+        nearest = [np.argmin(((grid - p) ** 2).sum(axis=1)) for p in to_unit_xyz(lats, lons)]
+        rows, cols = np.unravel_index(nearest, lat.shape)
+        pixels = {}
+        for w in BANDS:
+            dn = f[f"Image_data/NWLR_{w}"][:][rows, cols].astype(np.float32)
+            dn[(dn == 65535) | (dn > 50000) | (dn < 0)] = np.nan
+            pixels[f"Rrs_{w}_GPORTAL"] = dn * 2e-6 - 0.01
+        flags = f["Image_data/QA_flag"][:][rows, cols]
+        pixels["LAND_GPROTAL"] = (flags >> 1) & 1
+        pixels["TURBIDW_GPROTAL"] = (flags >> 14) & 1
+    extractor.close()
+    return rows, cols, pixels
+
+def assert_same(pixels, expected):
+    for k, v in expected.items():
+        assert np.allclose(np.asarray(pixels[k], dtype=float), np.asarray(v, dtype=float), equal_nan=True), k
+
+def test_batched_pixels(l2r):
+    lats, lons = points()
+    _, _, expected = reference(l2r, lats, lons)
+    extractor = GPortalL2RExtractor(l2r)
+    assert_same(extractor.get_pixels(lats, lons), expected)
+    # one point at a time gives the same values
+    single = [extractor.get_pixel(lat, lon) for lat, lon in zip(lats, lons)]
+    assert_same({k: [p[k] for p in single] for k in expected}, expected)
+    extractor.close()
+
+def test_lazy_geolocation(l2r):
+    lats, lons = points()
+    rows, cols, expected = reference(l2r, lats, lons)
+    extractor = GPortalL2RExtractor(l2r, lazy_geo=True)
+    found_rows, found_cols, _ = extractor.find_pixels(lats, lons)
+    assert found_rows.tolist() == rows.tolist() and found_cols.tolist() == cols.tolist()
+    assert_same(extractor.get_pixels(lats, lons), expected)
+    extractor.close()
+
+def test_window_and_point_reads(l2r, monkeypatch):
+    lats, lons = points()
+    _, _, expected = reference(l2r, lats, lons)
+    # the points spread over the product are read one by one instead of through their window
+    monkeypatch.setattr(utils, "WINDOW_LIMIT", 0)
+    extractor = GPortalL2RExtractor(l2r)
+    assert_same(extractor.get_pixels(lats, lons), expected)
+    extractor.close()
+
+def test_read_pixels(l2r, monkeypatch):
+    rows, cols = np.array([5, 199, 5, 120]), np.array([7, 0, 7, 179])
+    with h5py.File(l2r, "r") as f:
+        ds = f["Image_data/QA_flag"]
+        full = ds[:][rows, cols]
+        assert read_pixels(ds, rows, cols).tolist() == full.tolist()
+        monkeypatch.setattr(utils, "WINDOW_LIMIT", 0)
+        assert read_pixels(ds, rows, cols).tolist() == full.tolist()
+        assert len(read_pixels(ds, [], [])) == 0
@@ -0,0 +1,97 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import math
+import numpy as np
+from src.gportal.gportal_response import GPortalSearchResult
+from src.utils import inside_polygon, polygon_edges, best_polygons
+
+META_KEYS = (
+    "datasetId totalQualityCode cloudCoverPercentage operatorComment compressFlag physicalQuantity "
+    "browseImageSize parameterVersion algorithmVersion numberPixels numberLines numberBands numberMissingData "
+    "sceneNumber startPathNumber endPathNumber startArgumentLat endArgumentLat mapProjection mapDirection "
+    "orbitDirection tileNo downlinkSegmentNumber sensorOffPeriod sceneCenterTime ProcessTimeUnit tileHNo tileVNo "
+    "topicCategory organizationName pseq hasProduct"
+).split()
+PROPERTY_KEYS = (
+    "acquisitionType imageQualityDegradation imageQualityDegradationQuotationMode processingDate processingLevel "
+    "ProductType status beginPosition endPosition platformShortName instrumentShortName sensorType operationalMode "
+    "resolution orbitNumber lastOrbitNumber DayNight illuminationAzimuthAngle illuminationElevationAngle"
+).split()
+
+def feature(identifier: str, ring: list) -> dict:
+    """a catalog_records feature with the footprint ring [[lon, lat], ...]"""
+    gpp = {k: "1" for k in META_KEYS}
+    gpp.update(Resolution="250m", channels="VN01, VN02", bandWidth="1, 2",
+               startSubsatellitePosition="1 2", endSubsatellitePosition="3 4")
+    properties = {k: "x" for k in PROPERTY_KEYS}
+    properties.update(
+        identifier=identifier, status="ONLINE", multiExtentOf="1 2 3 4", centerOf="1 2", gpp=gpp,
+        product={"fileName": f"https://gportal.jaxa.jp/{identifier}.h5", "size": "10", "DataFormatType": "HDF5", "version": "1"},
+        browse=[{"type": "QUICKLOOK", "fileName": f"https://gportal.jaxa.jp/{identifier}.png"}],
+    )
+    return {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]}, "properties": properties}
+
+def square(lon, lat, size):
+    return [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+
+def reference(rings, lat, lon):
+    """the rule of filter_results written point by point: inside, then the farthest from the border"""
+    best, best_distance = None, -1
+    for i, ring in enumerate(rings):
+        px, py = [p[0] for p in ring], [p[1] for p in ring]
+        if not inside_polygon(px, py, lon, lat): continue
+        distance = math.inf
+        for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+            length = (x2 - x1) ** 2 + (y2 - y1) ** 2
+            t = 0 if length == 0 else min(max(((lon - x1) * (x2 - x1) + (lat - y1) * (y2 - y1)) / length, 0), 1)
+            distance = min(distance, math.hypot(lon - x1 - t * (x2 - x1), lat - y1 - t * (y2 - y1)))
+        if distance > best_distance:
+            best, best_distance = i, distance
+    return best
+
+def test_closest_to_center():
+    result = GPortalSearchResult({"features": [
+        feature("A", square(130, 30, 10)), feature("B", square(134, 30, 10)),
+    ]})
+    assert result.filter_results(35, 133).properties.identifier == "A"
+    assert result.filter_results(35, 141).properties.identifier == "B"
+    assert result.filter_results(35, 139).properties.identifier == "B"
+    assert result.filter_results(45, 139) is None
+    assert GPortalSearchResult({"features": []}).filter_results(35, 133) is None
+
+def test_matches_reference():
+    rng = np.random.default_rng(0)
+    rings = []
+    for _ in range(30):
+        lon, lat = rng.uniform(120, 150), rng.uniform(20, 50)
+        # skewed quadrilaterals like the swath footprints
+        ring = [[lon, lat], [lon + rng.uniform(3, 10), lat + rng.uniform(-1, 1)],
+                [lon + rng.uniform(3, 10), lat + rng.uniform(3, 10)], [lon + rng.uniform(-1, 1), lat + rng.uniform(3, 10)]]
+        rings.append(ring + [ring[0]])
+    result = GPortalSearchResult({"features": [feature(str(i), r) for i, r in enumerate(rings)]})
+    lats, lons = rng.uniform(15, 60, 500), rng.uniform(115, 160, 500)
+    selected = result.filter_many(lats, lons)
+    for lat, lon, f in zip(lats, lons, selected):
+        expected = reference(rings, lat, lon)
+        assert (f.properties.identifier if f is not None else None) == (str(expected) if expected is not None else None)
+
+def test_malformed_result_not_selected():
+    bad = feature("B", square(130, 30, 10))
+    del bad["properties"]["gpp"]
+    result = GPortalSearchResult({"features": [bad]})
+    assert result.filter_results(35, 135) is None
+
+def test_best_polygons_missing_points():
+    edges = polygon_edges([square(130, 30, 10), square(130, 30, 5)])
+    assert best_polygons(edges, [np.nan, 131, 200], [35, np.nan, 35]).tolist() == [-1, -1, -1]
+    # as far from both borders, the tie goes to the first polygon
+    assert best_polygons(edges, [131], [31]).tolist() == [0]
+    assert best_polygons(polygon_edges([]), [131], [31]).tolist() == [-1]
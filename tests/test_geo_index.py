@@ -0,0 +1,32 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import numpy as np
+from src.extractors.utils import GeoIndex
+
+def test_nearest_pixel():
+    lat, lon = np.meshgrid(np.linspace(30, 31, 11), np.linspace(130, 131, 21), indexing="ij")
+    rows, cols, distances = GeoIndex(lat, lon).query([30.3, 30.91], [130.5, 130.02])
+    assert rows.tolist() == [3, 9]
+    assert cols.tolist() == [10, 0]
+    assert np.all(distances < 3)
+
+def test_nan_points_not_found():
+    lat, lon = np.meshgrid(np.linspace(30, 31, 11), np.linspace(130, 131, 21), indexing="ij")
+    lat[0, 0] = np.nan
+    _, _, distances = GeoIndex(lat, lon).query([np.nan, 30.0], [130.5, 130.0])
+    assert np.isinf(distances[0])
+    assert np.isfinite(distances[1])
+
+def test_no_valid_pixel():
+    lat = np.full((4, 5), np.nan)
+    rows, cols, distances = GeoIndex(lat, lat.copy()).query([30.0, 31.0], [130.0, 131.0])
+    assert rows.tolist() == [0, 0] and cols.tolist() == [0, 0]
+    assert np.isinf(distances).all()
@@ -0,0 +1,78 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sys
+import pytest
+from src.gportal import GportalApi, GPortalLvlProd
+from src.gportal.gportal_manifest import GPortalDownloadManifest
+
+gportal_api = sys.modules["src.gportal.gportal_api"]
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(gportal_api, "CHUNK_SIZE", 1000)
+    monkeypatch.setattr(gportal_api, "backoff_delay", lambda attempt: 0)
+    api = GportalApi(GPortalLvlProd.L2R, max_workers=4)
+    yield api
+    api.close()
+
+def test_download(api, http_server, tmp_path):
+    path = api.download(http_server.url, tmp_path)
+    assert path.read_bytes() == http_server.content
+    assert sorted(http_server.ranges)[-1] == (10000, 10239)
+    assert not (tmp_path / "GC1SG1_TEST.h5.part").exists()
+    assert not (tmp_path / "GC1SG1_TEST.h5.part.json").exists()
+
+def test_resume(api, http_server, tmp_path):
+    # a previous run downloaded the first two chunks
+    content = http_server.content
+    (tmp_path / "GC1SG1_TEST.h5.part").write_bytes(content[:2000] + bytes(len(content) - 2000))
+    manifest = GPortalDownloadManifest(tmp_path / "GC1SG1_TEST.h5.part.json", http_server.url, len(content))
+    manifest.done = {(0, 999), (1000, 1999)}
+    manifest.save()
+    path = api.download(http_server.url, tmp_path)
+    assert path.read_bytes() == content
+    assert min(http_server.ranges)[0] == 2000
+    assert len(http_server.ranges) == 9
+
+def test_retry_bad_responses(api, http_server, tmp_path):
+    http_server.faults = ["503", "short", "503"]
+    path = api.download(http_server.url, tmp_path)
+    assert path.read_bytes() == http_server.content
+
+def test_retry_size_request(api, http_server, tmp_path):
+    http_server.faults = ["drop", "drop"]
+    path = api.download(http_server.url, tmp_path)
+    assert path.read_bytes() == http_server.content
+
+def test_failed_range_not_recorded(api, http_server, tmp_path):
+    http_server.content = http_server.content[:800] # a single chunk
+    http_server.faults = ["503"] * gportal_api.DOWNLOAD_RETRIES
+    assert api.download(http_server.url, tmp_path) is None
+    assert not (tmp_path / "GC1SG1_TEST.h5").exists()
+    manifest = GPortalDownloadManifest.load(tmp_path / "GC1SG1_TEST.h5.part.json", http_server.url, 800)
+    assert manifest.done == set()
+    # the next run downloads it
+    path = api.download(http_server.url, tmp_path)
+    assert path.read_bytes() == http_server.content
+
+def test_failed_file_does_not_stop_others(api, http_server, tmp_path):
+    missing = http_server.url.replace("GC1SG1_TEST", "GC1SG1_MISSING")
+    http_server.missing = {"/GC1SG1_MISSING.h5"}
+    paths = api.download_many([missing, http_server.url], tmp_path, max_files=2)
+    assert paths[0] is None
+    assert paths[1].read_bytes() == http_server.content
+
+def test_manifest_covers(tmp_path):
+    manifest = GPortalDownloadManifest(tmp_path / "m.json", "url", 30)
+    manifest.done = {(0, 9), (20, 29)}
+    assert not manifest.covers(30)
+    manifest.done.add((10, 19))
+    assert manifest.covers(30)
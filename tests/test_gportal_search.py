@@ -0,0 +1,67 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import urllib3
+from src.gportal import GportalApi, GPortalLvlProd, GPortalResolution
+from test_filter_results import feature, square
+
+@pytest.fixture
+def catalog():
+    """
+    local catalog_records server: catalog.body is the response, cut after catalog.sent bytes if set
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(server.body)))
+            self.end_headers()
+            self.wfile.write(server.body[:server.sent])
+            self.close_connection = True
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.url = "http://127.0.0.1:%d/catalog_records.json" % server.server_address[1]
+    server.body = json.dumps({"type": "FeatureCollection", "features": [feature("A", square(130, 30, 10))]}).encode()
+    server.sent = None
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+    thread.start()
+    api = GportalApi(GPortalLvlProd.L2R)
+    api.baseurl = server.url
+    yield server, api
+    api.close()
+    server.shutdown()
+    server.server_close()
+
+def test_search(catalog):
+    server, api = catalog
+    found = api.search("2023/01/01", 35, 135, GPortalResolution.H, verbose=False)
+    assert found.properties.identifier == "A"
+
+def test_malformed_response(catalog):
+    server, api = catalog
+    server.body = b'{"features": [{"type": "Feature"}'
+    assert api.search_area("2023/01/01", 35, 135, 35, 135, GPortalResolution.H, verbose=False) is None
+    server.body = b"<html>maintenance</html>"
+    assert api.search_area("2023/01/01", 35, 135, 35, 135, GPortalResolution.H, verbose=False) is None
+
+def test_connection_lost_while_reading(catalog):
+    server, api = catalog
+    server.sent = len(server.body) // 2
+    # raised to with_retry instead of reported as no product
+    with pytest.raises((requests.RequestException, urllib3.exceptions.HTTPError)):
+        api.search_area("2023/01/01", 35, 135, 35, 135, GPortalResolution.H, verbose=False)
@@ -0,0 +1,33 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import re
+from src.gportal import GportalApi, GPortalLvlProd
+from src.harvest import harvest_tiles
+
+def test_tiles_cover_the_area():
+    tiles = harvest_tiles([-90, -180, 90, 180], 60)
+    assert len(tiles) == 3 * 6
+    assert tiles[0] == (-90, -180, -30, -120)
+    assert tiles[-1] == (30, 120, 90, 180)
+    assert harvest_tiles([10, 20, 15, 25], 0) == [(10, 20, 15, 25)]
+
+def test_border_tiles_polygon_clamped():
+    api = GportalApi(GPortalLvlProd.L2R)
+    for min_lat, min_lon, max_lat, max_lon in harvest_tiles([-90, -180, 90, 180], 60):
+        polygon = api._GportalApi__construct_polygon_coordinates(min_lon, min_lat, max_lon, max_lat)
+        values = [float(v) for v in re.findall(r"-?[\d.]+", polygon)]
+        lons, lats = values[0::2], values[1::2]
+        assert min(lons) >= -180 and max(lons) <= 180
+        assert min(lats) >= -90 and max(lats) <= 90
+    # the inner borders are still enlarged
+    polygon = api._GportalApi__construct_polygon_coordinates(10, 20, 15, 25)
+    assert polygon == "POLYGON((15.5 25.5, 9.5 25.5, 9.5 19.5, 15.5 19.5, 15.5 25.5))"
+    api.close()
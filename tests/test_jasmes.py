@@ -0,0 +1,60 @@
+#
+# Copyright (c) 2024 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sys
+import time
+from src.jasmes import JasmesApi, JASMESInternalProd
+from src.jasmes.jasmes_listing_cache import JASMESListingCache
+
+jasmes_api = sys.modules["src.jasmes.jasmes_api"]
+
+CHLA = "pub/SGLI_NRT/L2_In-water_properties/CHLA"
+
+def test_listing_ttl(tmp_path):
+    cache = JASMESListingCache(tmp_path / "listings.json", ttl=3600)
+    cache.put("/a", {"f.nc": 1})
+    cache.put("/b", {}, ttl=0)
+    time.sleep(0.01)
+    assert cache.get("/a") == {"f.nc": 1}
+    assert cache.get("/b") is None
+    # the ttl of each listing is persisted
+    cache = JASMESListingCache(tmp_path / "listings.json", ttl=3600)
+    assert cache.get("/a") == {"f.nc": 1}
+    assert cache.get("/b") is None
+
+def publish(root, date):
+    day = root / CHLA / date
+    day.mkdir(parents=True)
+    (day / ("GC1SG1_%s0000_CHLA_10.nc" % date.replace("/", ""))).write_bytes(b"x" * 10)
+    return day
+
+def test_missing_date_listed_again(ftp_server, tmp_path, monkeypatch):
+    host, root, cred = ftp_server
+    monkeypatch.setattr(jasmes_api, "CACHE_FOLDER", tmp_path)
+    api = JasmesApi(host=host)
+    api.set_auth_details(cred)
+    api.set_prod(JASMESInternalProd.CHLA)
+
+    # published after the first search: remembered as missing until the short ttl ends
+    assert api.search("2023/01/01", 35.0, 135.0) is None
+    publish(root, "2023/01/01")
+    assert api.search("2023/01/01", 35.0, 135.0) is None
+
+    monkeypatch.setattr(jasmes_api, "MISSING_LISTING_TTL", 0)
+    assert api.search("2023/01/02", 35.0, 135.0) is None
+    day = publish(root, "2023/01/02")
+    time.sleep(0.01)
+    found = api.search("2023/01/02", 35.0, 135.0)
+    assert found is not None and found.fileSize == 10
+
+    # a published listing is kept for the normal ttl
+    for f in day.iterdir(): f.unlink()
+    assert api.search("2023/01/02", 35.0, 135.0) is not None
+    api.close()
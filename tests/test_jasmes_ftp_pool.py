@@ -0,0 +1,36 @@
+#
+# Copyright (c) 2024 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+from src.jasmes.jasmes_ftp_pool import FTPPool
+
+def test_reuses_connection(ftp_server):
+    host, root, _ = ftp_server
+    (root / "a.nc").write_bytes(b"x" * 10)
+    pool = FTPPool(host, "u", "p", size=2)
+    with pool.connection() as ftp:
+        first = ftp
+    with pool.connection() as ftp:
+        assert ftp is first
+        assert ftp.size("a.nc") == 10
+    pool.close()
+
+def test_replaces_connection_closed_while_idle(ftp_server):
+    host, root, _ = ftp_server
+    (root / "a.nc").write_bytes(b"x" * 10)
+    pool = FTPPool(host, "u", "p", size=2)
+    with pool.connection() as ftp:
+        first = ftp
+    # the server closes the idle connection (as after its idle timeout)
+    first.sock.sendall(b"QUIT\r\n")
+    assert first.getline().startswith("221")
+    with pool.connection() as ftp:
+        assert ftp is not first
+        assert ftp.size("a.nc") == 10
+    pool.close()
@@ -0,0 +1,50 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sys
+from argparse import Namespace
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from src.gportal import GPortalFootprintIndex, GPortalResolution
+from src.gportal.gportal_response import GPortalSearchResult
+from src.utils import ColumnBuffer
+from test_filter_results import feature, square
+
+search = sys.modules["src.search"]
+
+def test_join_matches_filter_results(tmp_path):
+    index = GPortalFootprintIndex(tmp_path / "index.sqlite")
+    features = {
+        "2023/01/01": [feature("A", square(130, 30, 10)), feature("B", square(134, 30, 10))],
+        "2023/01/02": [feature("C", square(130, 30, 4))],
+    }
+    for date, f in features.items():
+        index.put("10002000", GPortalResolution.H.value, date, "tile", GPortalSearchResult({"features": f}).results)
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "date": rng.choice(["2023/01/01", "2023-01-02", "2023/01/03"], 200),
+        "lat": rng.uniform(28, 42, 200), "lon": rng.uniform(128, 146, 200),
+    })
+    df.loc[0, "lat"] = np.nan
+    buffer = ColumnBuffer()
+    args = Namespace(footprint_index=tmp_path / "index.sqlite", no_repeat=False)
+    search.join_index(args, index, "10002000", df, buffer, tqdm(disable=True))
+    buffer.flush(df)
+    index.close()
+
+    for row in df.itertuples():
+        date = pd.to_datetime(row.date).strftime("%Y/%m/%d")
+        expected = None
+        if date in features:
+            f = GPortalSearchResult({"features": features[date]}).filter_results(row.lat, row.lon)
+            expected = f.properties.identifier if f is not None else None
+        assert (row.identifier if isinstance(row.identifier, str) else None) == expected
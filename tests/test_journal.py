@@ -0,0 +1,76 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import numpy as np
+import pandas as pd
+from src.journal import Journal
+
+def write_csv(path, lats):
+    pd.DataFrame({
+        "date": ["2023/01/01"] * len(lats), "lat": lats, "lon": [135.0] * len(lats),
+    }).to_csv(path, index=False)
+
+def test_replay(tmp_path):
+    csv = tmp_path / "in.csv"
+    write_csv(csv, [30.0, 31.0, 32.0])
+    journal = Journal(csv, "search", pd.read_csv(csv))
+    journal.add([0, 2], {"identifier": np.array(["a", "c"], dtype=object), "cloud_coverage": 5.0})
+
+    # the next run resumes from the journal
+    df = pd.read_csv(csv)
+    journal = Journal(csv, "search", df)
+    assert journal.done == {0, 2}
+    assert df["identifier"].tolist()[0] == "a" and df["identifier"].tolist()[2] == "c"
+    assert df["cloud_coverage"].tolist()[0] == 5.0
+    journal.add([1], {"identifier": "b", "cloud_coverage": 7.0})
+    journal.commit(df)
+    assert pd.read_csv(csv)["identifier"].tolist() == ["a", "b", "c"]
+    assert not journal.path.exists()
+
+def test_partly_written_entry_dropped(tmp_path):
+    csv = tmp_path / "in.csv"
+    write_csv(csv, [30.0, 31.0])
+    journal = Journal(csv, "search", pd.read_csv(csv))
+    journal.add([0], {"identifier": "a"})
+    with open(journal.path, "a") as f:
+        f.write('{"index": [1], "colu')
+    journal = Journal(csv, "search", pd.read_csv(csv))
+    assert journal.done == {0}
+    journal.add([1], {"identifier": "b"})
+    assert Journal(csv, "search", pd.read_csv(csv)).done == {0, 1}
+
+def test_other_csv_discarded(tmp_path):
+    csv = tmp_path / "in.csv"
+    write_csv(csv, [30.0, 31.0])
+    journal = Journal(csv, "search", pd.read_csv(csv))
+    journal.add([0], {"identifier": "a"})
+    # same number of rows, other points
+    write_csv(csv, [40.0, 41.0])
+    df = pd.read_csv(csv)
+    journal = Journal(csv, "search", df)
+    assert journal.done == set()
+    assert "identifier" not in df.columns
+
+def test_resume_over_nan_column(tmp_path):
+    csv = tmp_path / "in.csv"
+    write_csv(csv, [30.0, 31.0, 32.0])
+    df = pd.read_csv(csv)
+    df["identifier"] = np.nan # searched before, nothing found
+    df.to_csv(csv, index=False)
+    journal = Journal(csv, "search", pd.read_csv(csv))
+    # one value per row, as added by join_index
+    journal.add([0, 2], {"identifier": np.array(["a", "c"], dtype=object)})
+
+    df = pd.read_csv(csv)
+    journal = Journal(csv, "search", df)
+    assert df["identifier"].iloc[0] == "a"
+    assert pd.isna(df["identifier"].iloc[1])
+    journal.commit(df)
+    assert pd.isna(pd.read_csv(csv)["identifier"].iloc[1])
@@ -0,0 +1,49 @@
+#
+# Copyright (c) 2023 Muhammad Salah msalah.29.10@gmail.com
+# Licensed under AGPL-3.0-or-later.
+# Refer to COPYING.txt for the AGPL license.
+# All rights reserved.
+# This project is developed as part of my research in the Remote Sensing Laboratory
+# in Kyoto University of Advanced Science towards my Master's Degree course.
+# The research was mainly supervised by Professor Salem Ibrahim Salem.
+#
+
+import sys
+from argparse import Namespace
+import pandas as pd
+import pytest
+import requests
+from src.api_types import SGLIAPIs
+
+search = sys.modules["src.search"]
+
+class FailingApi:
+    """answers the searches, the searches of the failing latitudes always time out"""
+    def __init__(self, failing: set):
+        self.failing = failing
+        self.calls = 0
+
+    def search(self, date, lat, lon, resolution, verbose=True):
+        self.calls += 1
+        if lat in self.failing:
+            raise requests.Timeout("timed out")
+        return f"{date} {lat} {lon}"
+
+def test_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(search, "backoff_delay", lambda attempt: 0)
+    api = FailingApi({1.0})
+    with pytest.raises(requests.Timeout):
+        search.search_with_retry(api, "2023/01/01", 1.0, 2.0, None)
+    assert api.calls == search.SEARCH_RETRIES
+
+def test_failed_search_reported(monkeypatch):
+    monkeypatch.setattr(search, "backoff_delay", lambda attempt: 0)
+    args = Namespace(api=SGLIAPIs.GPORTAL, search_workers=2, rate_limit=None, search_cluster=0, no_repeat=False)
+    df = pd.DataFrame({"date": ["2023/01/01"] * 3, "lat": [0.0, 1.0, 2.0], "lon": [10.0, 11.0, 12.0]})
+    results = [
+        (g.index.tolist(), result)
+        for g, _, result in search.iter_search(args, FailingApi({1.0}), search.group_rows(args, df), "identifier")
+    ]
+    assert results == [
+        ([0], "2023/01/01 0.0 10.0"), ([1], search.SEARCH_FAILED), ([2], "2023/01/01 2.0 12.0"),
+    ]